@@ -0,0 +1,119 @@
+"""
+Compares the solver backends of the methods on sampled households.
+"""
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+from methods.backends import BACKENDS, is_available
+from methods.price import MaxMinPriceMethod, MinMaxPriceMethod
+from methods.utility import MaxMinUtilityMethod
+from methods.demand import MinMaxDemandMethod
+from methods.slack import MaxMinSlackMethod
+from methods.solver import SolverError
+from utils import Process, sample_dirichlet
+
+
+class Benchmark(Process):
+    """
+    Solves the same sampled households with every method on every backend and
+    reports the mean seconds per step and the largest price difference to the
+    first backend.
+        {
+            "backends": ["glpk", "highs", "numpy"],
+            "methods": ["MaxMinUtilityMethod", "MinMaxPriceMethod"],
+            "n": [3, 5, 10],
+            "num_samples": 100,
+            "mean_scale": 20,
+            "initial_scale": 10,
+            "seed": 0
+        }
+    Each backend solves one household before timing, so that imports and other
+    one-off setup costs are not counted. "backends" defaults to those whose
+    solvers can be imported, and backends that cannot are skipped with a
+    warning.
+    """
+
+    def __init__(self, dir):
+        super().__init__(dir)
+
+    def run(self):
+        """
+        Runs the benchmark and writes the results to benchmark.json.
+        """
+        backends = []
+        for backend in getattr(self, "backends", list(BACKENDS)):
+            if is_available(backend):
+                backends.append(backend)
+            else:
+                logging.warning(f"Skipping backend {backend}, whose solvers cannot "
+                                f"be imported.")
+        ns = self.n if isinstance(self.n, list) else [self.n]
+        results = []
+        for n in ns:
+            uniform = np.ones((self.num_samples, n)) / n
+            means = sample_dirichlet(uniform * getattr(self, "mean_scale", 20),
+                                     random_state=self.random_state)
+            alphas = (np.repeat(means[:, np.newaxis, :], n, axis=1) *
+                      getattr(self, "initial_scale", 10))
+            valuations = sample_dirichlet(alphas, random_state=self.random_state)
+
+            for method_name in self.methods:
+                assert(method_name in globals())
+                method_class = globals()[method_name]
+                reference = None
+                for backend in backends:
+                    result, prices = benchmark_backend(method_class, valuations, backend)
+                    if reference is None:
+                        reference = prices
+                        result["max_price_difference"] = 0.0
+                    else:
+                        both = ~np.isnan(reference[:, 0]) & ~np.isnan(prices[:, 0])
+                        result["max_price_difference"] = float(
+                            np.max(np.abs(reference[both] - prices[both]), initial=0))
+                    result.update({"n": n, "method": method_name, "backend": backend})
+                    results.append(result)
+                    logging.info(f"{method_name} on {backend}, n={n}: "
+                                 f"{result['assignment'] * 1000:.2f} ms assignment, "
+                                 f"{result['prices'] * 1000:.2f} ms prices, "
+                                 f"{result['num_failures']} failures.",
+                                 extra={"data": result})
+
+        with open(os.path.join(self.dir, "benchmark.json"), "w") as f:
+            json.dump(results, f, indent=4)
+
+
+def benchmark_backend(method_class, valuations, backend):
+    """
+    Solves each household of valuations with method_class on backend.
+    args:
+        method_class    (class)     a class of Method type
+        valuations      (ndarray)   3D array of shape (num_samples, n, n)
+        backend         (str)       the name of the backend
+    returns:
+        result          (dict)      mean seconds of the assignment and price
+                        steps and the number of failures
+        prices          (ndarray)   2D array of shape (num_samples, n) of prices,
+                        nan for failures
+    """
+    method_class(valuations[0], verbosity=0, backend=backend).solve()
+
+    timings = []
+    prices = np.full(valuations.shape[:2], np.nan)
+    num_failures = 0
+    for i, curr_valuations in enumerate(valuations):
+        method = method_class(curr_valuations, verbosity=0, backend=backend)
+        start = time.perf_counter()
+        try:
+            _, prices[i] = method.solve()
+            timings.append(method.timings)
+        except SolverError:
+            num_failures += 1
+            timings.append({"assignment": time.perf_counter() - start, "prices": 0.0})
+    result = {"assignment": float(np.mean([timing["assignment"] for timing in timings])),
+              "prices": float(np.mean([timing["prices"] for timing in timings])),
+              "num_failures": num_failures}
+    return result, prices
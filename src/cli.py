@@ -6,7 +6,11 @@ import os
 import click
 
 from split import SplitCli
+from benchmark import Benchmark
+from grid import Grid
+from loadtest import LoadTest
 from noisy import NoisySimulation
+from plot import Plot, plot_dirs
 from survey import SurveyResults
 from simulate import Simulation
 
@@ -29,14 +33,25 @@ def get_process(process_name):
 @click.option(
     "--dir",
     type=str,
-    default="experiments/split/first_split"
+    multiple=True,
+    default=["experiments/split/first_split"]
 )
-def main(process, dir):
+@click.option(
+    "--num_workers",
+    type=int,
+    default=1
+)
+def main(process, dir, num_workers):
     print("Spliddit Analysis")
     print("-----------------")
 
-    split = get_process(process)(dir)
-    split.run()
+    if get_process(process) is Plot:
+        plot_dirs(dir, num_workers=num_workers)
+        return
+
+    for curr_dir in dir:
+        split = get_process(process)(curr_dir)
+        split.run()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
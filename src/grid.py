@@ -0,0 +1,241 @@
+"""
+Runs noisy valuation sweeps over a grid of parameters. The grid is expanded
+into cells, one per method, noise scale and combination of the other
+parameters, and each cell's result is cached under the hash of its parameters,
+so that cells shared with earlier experiments are not run again.
+"""
+import hashlib
+import itertools
+import json
+import logging
+import os
+from multiprocessing import Pool
+
+import numpy as np
+
+from methods.price import MaxMinPriceMethod, MinMaxPriceMethod
+from methods.utility import MaxMinUtilityMethod
+from methods.demand import MinMaxDemandMethod
+from methods.slack import MaxMinSlackMethod
+from methods.solver import SolverError
+from plot import plot_fractions
+from sweep import get_envy_free
+from utils import Process, sample_dirichlet
+
+# tags the cached results, to be increased whenever the code computing a cell's
+# result changes, so that results of older code are not reused
+CACHE_VERSION = 3
+
+# parameters a cell's result depends on, in the order of group names
+GROUP_KEYS = ["n", "num_samples", "mean_scale", "initial_scale", "seed"]
+GROUP_PREFIXES = {"n": "n", "num_samples": "s", "mean_scale": "m",
+                  "initial_scale": "i", "seed": "seed"}
+
+
+class Grid(Process):
+    """
+    Runs a grid of noisy valuation sweeps. Parameters of NoisySimulation may be
+    given as lists, "seed" seeds the samples of each cell, "method_options"
+    gives keyword arguments of each method, and "tiebreak" and "dtype" apply to 
+    every cell as in NoisySimulation:
+        {
+            "methods": ["MinMaxPriceMethod", "MaxMinUtilityMethod"],
+            "method_options": {"MaxMinUtilityMethod": {"leximin": true}},
+            "n": [3, 6],
+            "num_samples": 1000,
+            "scale_range": [1, 11],
+            "scale_samples": 50,
+            "mean_scale": 20,
+            "initial_scale": [10, 15],
+            "seed": 0
+        }
+    Cell results are cached in "cache_dir", by default the cache directory next
+    to the experiment, under a hash of the cell's parameters, its method options
+    and CACHE_VERSION. The results of each combination of n, num_samples,
+    mean_scale, initial_scale and seed are written to a subdirectory, e.g.
+    n3_s1000_m20_i10_seed0/results.json, in the format of NoisySimulation, 
+    together with the number of samples of each cell without solution.
+    """
+
+    def __init__(self, dir):
+        super().__init__(dir)
+
+    def run(self):
+        """
+        Expands the grid, runs the cells missing from the cache over "num_workers"
+        processes and writes the results of each group.
+        """
+        cache_dir = getattr(self, "cache_dir",
+                            os.path.join(os.path.dirname(os.path.normpath(self.dir)), "cache"))
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+        cells = self.get_cells()
+        missing = [cell for cell in cells
+                   if not os.path.exists(get_cell_path(cache_dir, cell))]
+        logging.info(f"Running {len(missing)} of {len(cells)} cells.",
+                     extra={"data": {"num_cells": len(cells), "num_missing": len(missing)}})
+
+        args = [(cell, cache_dir) for cell in missing]
+        num_workers = getattr(self, "num_workers", 1)
+        if num_workers > 1:
+            with Pool(num_workers) as pool:
+                pool.starmap(run_cell, args)
+        else:
+            for arg in args:
+                run_cell(*arg)
+
+        self.save_results(cache_dir)
+
+    def get_noise_scales(self):
+        """
+        Returns the noise scales of the grid, either "noise_scales" or
+        "scale_samples" scales spaced logarithmically over "scale_range".
+        """
+        if hasattr(self, "noise_scales"):
+            return list(self.noise_scales)
+        return np.logspace(self.scale_range[0], self.scale_range[1],
+                           num=self.scale_samples).tolist()
+
+    def get_groups(self):
+        """
+        Expands the list-valued parameters other than methods and noise scales.
+        returns:
+            groups  (list)  dicts of the values of GROUP_KEYS
+        """
+        values = []
+        for key in GROUP_KEYS:
+            value = getattr(self, key, 0 if key == "seed" else None)
+            values.append(value if isinstance(value, list) else [value])
+        return [dict(zip(GROUP_KEYS, group)) for group in itertools.product(*values)]
+
+    def get_cells(self):
+        """
+        Expands the grid into cells.
+        returns:
+            cells   (list)  dicts of a method, a noise scale and a group
+        """
+        cells = []
+        for group in self.get_groups():
+            for method in self.methods:
+                for noise_scale in self.get_noise_scales():
+                    cells.append(self.get_cell(method, noise_scale, group))
+        return cells
+
+    def get_cell(self, method, noise_scale, group):
+        """
+        Builds the parameters of a cell.
+        returns:
+            cell    (dict)  the method, its options, the noise scale, the tiebreak
+                    flag, the dtype and the group
+        """
+        options = getattr(self, "method_options", {}).get(method, {})
+        return {"method": method, "options": options, "noise_scale": noise_scale,
+                "tiebreak": bool(getattr(self, "tiebreak", False)),
+                "dtype": str(np.dtype(getattr(self, "dtype", "float64"))), **group}
+
+    def save_results(self, cache_dir):
+        """
+        Collects the cached results of the cells into results.json in the directory
+        of each group, and plots them unless "defer_plots" is set.
+        """
+        noise_scales = self.get_noise_scales()
+        for group in self.get_groups():
+            fractions = {}
+            failures = {}
+            for method in self.methods:
+                fractions[method] = []
+                failures[method] = []
+                for noise_scale in noise_scales:
+                    cell = self.get_cell(method, noise_scale, group)
+                    with open(get_cell_path(cache_dir, cell)) as f:
+                        result = json.load(f)
+                    fractions[method].append(result["fraction"])
+                    failures[method].append(result["num_failed"])
+
+            group_dir = os.path.join(self.dir, get_group_name(group))
+            if not os.path.exists(group_dir):
+                os.makedirs(group_dir)
+            with open(os.path.join(group_dir, "results.json"), "w") as f:
+                json.dump({"noise_scales": noise_scales, "fractions": fractions,
+                           "failures": failures, "group": group}, f, indent=4)
+            if not getattr(self, "defer_plots", False):
+                plot_fractions(noise_scales, fractions, getattr(self, "x_scale", "log"),
+                               os.path.join(group_dir, "figures", "simulation.pdf"))
+
+
+def get_group_name(group):
+    """
+    Names a group by its parameters, e.g. n3_s1000_m20_i10_seed0.
+    """
+    return "_".join(f"{GROUP_PREFIXES[key]}{group[key]}" for key in GROUP_KEYS)
+
+
+def get_cell_hash(cell):
+    """
+    Hashes the parameters of a cell together with CACHE_VERSION. Scales are 
+    rounded to 12 significant digits, so that the same noise scale computed by 
+    different grids hashes the same.
+    """
+    cell = {key: float(f"{float(value):.12g}") if key.endswith("scale") else value
+            for key, value in cell.items()}
+    cell["cache_version"] = CACHE_VERSION
+    return hashlib.sha1(json.dumps(cell, sort_keys=True).encode()).hexdigest()
+
+
+def get_cell_path(cache_dir, cell):
+    """
+    Returns the path of a cell's cached result.
+    """
+    return os.path.join(cache_dir, f"{get_cell_hash(cell)}.json")
+
+
+def run_cell(cell, cache_dir):
+    """
+    Estimates the fraction of envy-free splits of one cell and caches it together
+    with the number of samples without solution, which count as not envy-free. 
+    Starting valuations are sampled first from the cell's seed, so cells that 
+    differ only in method or noise scale share them. With "tiebreak" set, ties 
+    of sample i are broken with the seed [seed, i], as in NoisySimulation.
+    args:
+        cell        (dict)  the parameters of the cell
+        cache_dir   (str)   where to cache the result
+    """
+    assert(cell["method"] in globals())
+    method_class = globals()[cell["method"]]
+    random_state = np.random.RandomState(cell["seed"])
+    n = cell["n"]
+    num_samples = cell["num_samples"]
+    dtype = cell["dtype"]
+
+    uniform = np.ones((num_samples, n)) / n
+    means = sample_dirichlet(uniform * cell["mean_scale"], random_state=random_state)
+    alphas = np.repeat(means[:, np.newaxis, :], n, axis=1) * cell["initial_scale"]
+    valuations = sample_dirichlet(alphas, dtype=dtype, random_state=random_state)
+    noisy_valuations = sample_dirichlet(valuations * cell["noise_scale"], dtype=dtype,
+                                        random_state=random_state)
+
+    assignments = np.zeros((num_samples, n), dtype=int)
+    prices = np.zeros((num_samples, n), dtype=dtype)
+    solved = np.ones(num_samples, dtype=bool)
+    for i in range(num_samples):
+        tiebreak = [cell["seed"], i] if cell["tiebreak"] else None
+        method = method_class(noisy_valuations[i], verbosity=0, tiebreak=tiebreak,
+                              **cell["options"])
+        try:
+            assignments[i], prices[i] = method.solve()
+        except SolverError:
+            solved[i] = False
+    num_failed = int(np.sum(~solved))
+    if num_failed:
+        logging.info(f"{num_failed} of {num_samples} samples without solution.",
+                     extra={"data": {"cell": cell, "num_failed": num_failed}})
+    fraction = float(np.mean(solved & get_envy_free(valuations, assignments, prices)))
+
+    # written to a temporary file first, so that a cached result is always complete
+    path = get_cell_path(cache_dir, cell)
+    with open(path + ".tmp", "w") as f:
+        json.dump({"cell": cell, "fraction": fraction, "num_failed": num_failed}, f,
+                  indent=4)
+    os.replace(path + ".tmp", path)
+    return fraction
@@ -2,10 +2,21 @@
 """
 
 from flask import Flask, render_template, request, redirect, Response
+from flask import stream_with_context
+from werkzeug.serving import WSGIRequestHandler
 import random
 import json
+import logging
+import time
 
 from split import Split
+from utils import to_json
+
+# orjson serializes ndarrays natively, json is the fallback
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 app = Flask(__name__)
 
@@ -15,17 +26,126 @@ def output():
     return render_template('index.html', name='Chris')
 
 
+class Timings():
+    """
+    Records the seconds spent in consecutive stages of a request, reported in the
+    Server-Timing header so that load tests can break down latency.
+    """
+
+    def __init__(self):
+        self.durations = {}
+        self.last = time.perf_counter()
+
+    def stage(self, name):
+        """
+        Ends the stage called name, which began when the previous one ended.
+        """
+        now = time.perf_counter()
+        self.durations[name] = now - self.last
+        self.last = now
+
+    def update(self, durations):
+        """
+        Adds durations measured elsewhere, e.g. by a method.
+        """
+        self.durations.update(durations)
+        self.last = time.perf_counter()
+
+    def get_header(self):
+        """
+        Returns the durations in milliseconds as a Server-Timing header value.
+        """
+        return ", ".join(f"{name};dur={duration * 1000:.3f}"
+                         for name, duration in self.durations.items())
+
+
 @app.route('/receiver', methods=['POST'])
 def worker():
     # read json + reply
-    print("hello")
+    timings = Timings()
     data = request.get_json(force=True)
+    timings.stage("parse")
     split = Split(data)
-    split.solve()
+    timings.stage("preprocess")
+    split.solve(verbosity=0)
+    timings.update(split.timings)
     results = split.get_results()
-    split.output_results()
-    print(results)
-    return json.dumps(results)
+    timings.stage("results")
+    logging.info("Solved split.", extra={"data": {"results": results}})
+    timings.stage("output")
+    response = json.dumps(results)
+    timings.stage("serialize")
+    return Response(response, headers={"Server-Timing": timings.get_header()})
+
+
+@app.route('/splits', methods=['POST'])
+def splits():
+    """
+    Solves splits posted as newline-delimited JSON, one split per line in the
+    format of Split, optionally with an "id" and a "method". Results are streamed
+    back as they are solved, one line per split in the order received, in the
+    format of Split.get_result_arrays, or {"error": ...} if a split could not be
+    parsed or solved, after which the stream continues. Lines with "timings" set
+    get the seconds spent in each stage.
+    """
+    def generate():
+        for line in request.stream:
+            if line.strip():
+                yield solve_line(line)
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+def solve_line(line):
+    """
+    Solves the split on one line of a request and serializes its results.
+    args:
+        line    (bytes) JSON encoded split
+    returns:
+        line    (bytes) JSON encoded results ending in a newline
+    """
+    timings = Timings()
+    params = {}
+    try:
+        params = loads(line)
+        timings.stage("parse")
+        split = Split(params)
+        timings.stage("preprocess")
+        split.solve(method_class=split.get_method_class(), verbosity=0)
+        timings.update(split.timings)
+        results = split.get_result_arrays()
+        timings.stage("results")
+    except Exception as e:
+        # any failure, e.g. a SolverError or LinAlgError, stays on its own line
+        # so that the rest of the stream is still solved
+        results = {"error": f"{type(e).__name__}: {e}" if str(e) else type(e).__name__}
+    if isinstance(params, dict) and "id" in params:
+        results["id"] = params["id"]
+    if isinstance(params, dict) and params.get("timings", False):
+        results["timings"] = timings.durations
+    return dumps(results)
+
+
+def loads(line):
+    """
+    Parses one line of JSON.
+    """
+    if orjson is not None:
+        return orjson.loads(line)
+    return json.loads(line)
+
+
+def dumps(data):
+    """
+    Serializes data, which may hold ndarrays and numpy scalars, to one line of
+    JSON.
+    """
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY |
+                                         orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(data, default=to_json) + "\n").encode()
+
 
 if __name__ == "__main__":
-    app.run()
+    # HTTP/1.1 keeps connections of programmatic clients alive between requests
+    WSGIRequestHandler.protocol_version = "HTTP/1.1"
+    app.run(threaded=True)
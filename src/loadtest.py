@@ -0,0 +1,294 @@
+"""
+Measures the latency and throughput of the split server under load.
+"""
+import http.client
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from urllib.parse import urlparse
+
+import numpy as np
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from utils import Process, sample_dirichlet
+
+
+class LoadTest(Process):
+    """
+    Sends generated splits to the /splits or /receiver endpoint of the server
+    and reports latency percentiles, throughput and the server's time per stage.
+        {
+            "url": "http://127.0.0.1:5000/splits",
+            "launch": false,
+            "n": [3, 4, 5],
+            "total_rent": 3000,
+
+            "qps": 50,
+            "duration": 10,
+            "num_connections": 8,
+
+            "concurrency": [1, 2, 4, 8]
+        }
+    With "launch", the server is started in this process on a free port and
+    "url" only gives the endpoint. With "qps", requests are sent on a schedule
+    rather than when the previous one returns, and latency is measured from the
+    scheduled time, so that a slow server is not hidden by a slowed down client.
+    With "concurrency", each level keeps that many requests in flight for
+    "duration" seconds instead.
+    """
+
+    def __init__(self, dir):
+        super().__init__(dir)
+
+    def run(self):
+        """
+        Runs the load test and writes the results to loadtest.json.
+        """
+        url = getattr(self, "url", "http://127.0.0.1:5000/splits")
+        server = None
+        if getattr(self, "launch", False):
+            server = start_server()
+            url = f"http://127.0.0.1:{server.server_port}{urlparse(url).path}"
+
+        ns = self.n if isinstance(self.n, list) else [self.n]
+        payloads = generate_payloads(getattr(self, "num_payloads", 1000), ns,
+                                     getattr(self, "total_rent", 3000),
+                                     getattr(self, "mean_scale", 20),
+                                     getattr(self, "initial_scale", 10),
+                                     self.random_state)
+        try:
+            if hasattr(self, "concurrency"):
+                results = [run_closed_loop(url, payloads, concurrency, self.duration)
+                           for concurrency in self.concurrency]
+            else:
+                results = [run_load(url, payloads, self.qps, self.duration,
+                                    getattr(self, "num_connections", 8))]
+        finally:
+            if server is not None:
+                server.shutdown()
+
+        for result in results:
+            logging.info(f"{result['concurrency']} connections: {result['qps']:.1f} qps, "
+                         f"p50 {result['p50'] * 1000:.1f} ms, "
+                         f"p99 {result['p99'] * 1000:.1f} ms, "
+                         f"{result['num_errors']} errors.",
+                         extra={"data": result})
+        with open(os.path.join(self.dir, "loadtest.json"), "w") as f:
+            json.dump(results, f, indent=4)
+
+
+def start_server():
+    """
+    Starts the web service on a free local port in a background thread.
+    returns:
+        server  (BaseWSGIServer) with server_port and shutdown()
+    """
+    from js_io import app
+
+    # the request log would otherwise fill the load test's log
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    WSGIRequestHandler.protocol_version = "HTTP/1.1"
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def generate_payloads(num_payloads, ns, total_rent=3000, mean_scale=20, initial_scale=10,
+                      random_state=np.random):
+    """
+    Generates splits with valuations distributed as in Simulation, each with n
+    drawn from ns and valuations rounded to whole units of rent.
+    args:
+        num_payloads    (int)   number of splits
+        ns              (list)  numbers of agents to draw from
+        total_rent      (int)   the rent of each split
+        mean_scale      (float) as in Simulation
+        initial_scale   (float) as in Simulation
+        random_state    (RandomState) to sample with
+    returns:
+        payloads        (list)  dicts in the format of Split
+    """
+    payloads = []
+    for i in range(num_payloads):
+        n = ns[i % len(ns)]
+        mean = sample_dirichlet(np.full(n, mean_scale / n), random_state=random_state)
+        valuations = sample_dirichlet(np.tile(mean * initial_scale, (n, 1)),
+                                      random_state=random_state)
+
+        # whole units that still sum to the rent
+        valuations = np.floor(valuations * total_rent).astype(int)
+        valuations[:, 0] += total_rent - np.sum(valuations, axis=1)
+        payloads.append({"id": i, "n": n, "total_rent": total_rent, "timings": True,
+                         "agent_to_valuations": {f"agent_{j}": valuations[j].tolist()
+                                                 for j in range(n)}})
+    return payloads
+
+
+class Client():
+    """
+    Posts payloads over one persistent connection and records the latency and
+    server stage timings of each request.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.path = urlparse(url).path
+        self.connection = connect(url)
+        self.latencies = []
+        self.timings = []
+        self.num_errors = 0
+
+    def send(self, payload, start=None):
+        """
+        Posts payload and records its latency from start, by default now.
+        """
+        if start is None:
+            start = time.perf_counter()
+        try:
+            if self.path.endswith("/receiver"):
+                body, header = post(self.connection, self.path, json.dumps(payload).encode())
+                self.timings.append(parse_server_timing(header))
+            else:
+                body, _ = post(self.connection, self.path,
+                               (json.dumps(payload) + "\n").encode())
+                for line in body.splitlines():
+                    result = json.loads(line)
+                    if "error" in result:
+                        self.num_errors += 1
+                    self.timings.append(result.get("timings", {}))
+        except (OSError, http.client.HTTPException):
+            self.num_errors += 1
+            self.connection.close()
+            self.connection = connect(self.url)
+        self.latencies.append(time.perf_counter() - start)
+
+
+def run_load(url, payloads, qps, duration, num_connections=8):
+    """
+    Posts payloads in turn at qps requests per second for duration seconds, over
+    num_connections persistent connections.
+    args:
+        url             (str)   the endpoint
+        payloads        (list)  dicts in the format of Split
+        qps             (float) the target rate
+        duration        (float) seconds to send for
+        num_connections (int)   number of client threads and connections
+    returns:
+        results         (dict)  see summarize
+    """
+    tasks = queue.Queue()
+    clients = [Client(url) for _ in range(num_connections)]
+
+    def send(client):
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            i, scheduled = task
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            client.send(payloads[i % len(payloads)], start=scheduled)
+
+    threads = [threading.Thread(target=send, args=(client,)) for client in clients]
+    for thread in threads:
+        thread.start()
+    start = time.perf_counter()
+    for i in range(int(qps * duration)):
+        tasks.put((i, start + i / qps))
+    for _ in threads:
+        tasks.put(None)
+    for thread in threads:
+        thread.join()
+
+    results = summarize(clients, time.perf_counter() - start)
+    results["target_qps"] = qps
+    return results
+
+
+def run_closed_loop(url, payloads, concurrency, duration):
+    """
+    Keeps concurrency requests in flight for duration seconds, each client
+    posting its next payload as soon as the previous one returns.
+    returns:
+        results         (dict)  see summarize
+    """
+    clients = [Client(url) for _ in range(concurrency)]
+    start = time.perf_counter()
+
+    def send(client, offset):
+        i = offset
+        while time.perf_counter() - start < duration:
+            client.send(payloads[i % len(payloads)])
+            i += concurrency
+
+    threads = [threading.Thread(target=send, args=(client, offset))
+               for offset, client in enumerate(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(clients, time.perf_counter() - start)
+
+
+def summarize(clients, elapsed):
+    """
+    Combines the records of all clients.
+    returns:
+        results     (dict)  number of connections, requests and errors, achieved
+                    qps, latency percentiles in seconds and the server's mean
+                    seconds per stage
+    """
+    latencies = np.concatenate([client.latencies for client in clients])
+    timings = [timing for client in clients for timing in client.timings]
+    stages = {name for timing in timings for name in timing}
+    return {"concurrency": len(clients),
+            "num_requests": len(latencies),
+            "num_errors": sum(client.num_errors for client in clients),
+            "qps": len(latencies) / elapsed,
+            "p50": float(np.percentile(latencies, 50)),
+            "p90": float(np.percentile(latencies, 90)),
+            "p99": float(np.percentile(latencies, 99)),
+            "max": float(np.max(latencies)),
+            "stages": {name: float(np.mean([timing[name] for timing in timings
+                                            if name in timing]))
+                       for name in sorted(stages)}}
+
+
+def connect(url):
+    """
+    Opens a persistent connection to the host of url.
+    """
+    parsed = urlparse(url)
+    return http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=60)
+
+
+def post(connection, path, body):
+    """
+    Posts body and reads the whole response.
+    returns:
+        body    (bytes) the response body
+        header  (str)   the Server-Timing header, empty if missing
+    """
+    connection.request("POST", path, body=body,
+                       headers={"Content-Type": "application/x-ndjson"})
+    response = connection.getresponse()
+    data = response.read()
+    if response.status != 200:
+        raise http.client.HTTPException(f"status {response.status}")
+    return data, response.getheader("Server-Timing", "")
+
+
+def parse_server_timing(header):
+    """
+    Parses a Server-Timing header into seconds per stage.
+    """
+    timings = {}
+    for entry in header.split(","):
+        name, _, duration = entry.strip().partition(";dur=")
+        if duration:
+            timings[name] = float(duration) / 1000
+    return timings
@@ -0,0 +1,258 @@
+"""
+Implements the auction algorithm of Bertsekas for the welfare-maximizing assignment,
+with epsilon-scaling and vectorized bidding rounds. See
+http://www.mit.edu/~dimitrib/Auction_Survey.pdf for details.
+"""
+
+import numpy as np
+
+from methods.solver import SolverError
+
+
+def auction(valuations, capacities=None, epsilon=None, scaling=5, top_k=None,
+            max_rounds=1000000):
+    """
+    Assigns rooms to agents by an auction. In every round all unassigned agents bid
+    at once for their most profitable room, raising its price by the gap to their
+    second best room plus epsilon, and each room goes to its highest bidder. The
+    result is within n * epsilon of the maximum welfare, and the final prices
+    support it: no agent gains more than epsilon by moving to another room.
+
+    With epsilon-scaling, the auction is first run with a large epsilon and then
+    repeated with epsilon divided by scaling, starting from the previous prices.
+    When there are spare rooms, the result is only optimal if no spare room costs 
+    more than an assigned one, which prices carried over from an earlier phase 
+    may break. So every phase is followed by a reverse phase, in which spare rooms
+    priced above the cheapest assigned room bid for agents by lowering their 
+    price, until each is either assigned or down to that lower bound. 
+
+    With top_k, agents only bid for their top_k most valued rooms. Since prices only
+    rise during a phase, the best profit outside an agent's list at the start of
+    the phase bounds it for the rest of the phase. Bids never undercut that bound,
+    and agents whose list falls below it bid over all rooms from then on.
+    args:
+        valuations      (ndarray)   2D matrix of shape (n, m) where position (i, j)
+                        gives the valuation of agent i for room j.
+        capacities      (ndarray)   1D array of shape (m,) giving the number of
+                        agents each room holds. Defaults to one per room.
+        epsilon         (float)     the final bid increment. Defaults to 1e-9 of the
+                        valuation range.
+        scaling         (float)     the factor epsilon is divided by between phases
+        top_k           (int)       the number of candidate rooms per agent
+        max_rounds      (int)       the maximum number of bidding rounds per phase
+    returns:
+        assignments     (ndarray)   1D array of shape (n,) of assignments
+        prices          (ndarray)   1D array of shape (m,) of room prices
+    raises:
+        SolverError     if a phase leaves an agent unassigned after max_rounds
+    """
+    n, m = valuations.shape
+    if capacities is None:
+        capacities = np.ones(m, dtype=int)
+    capacities = np.asarray(capacities, dtype=int)
+    assert(np.sum(capacities) >= n)
+
+    # rooms that hold several agents are split into one slot per agent
+    slot_rooms = np.repeat(np.arange(m), capacities)
+    slot_valuations = valuations[:, slot_rooms] if np.any(capacities != 1) else valuations
+    num_slots = len(slot_rooms)
+
+    value_range = max(np.max(valuations) - np.min(valuations), 1e-12)
+    if epsilon is None:
+        epsilon = value_range * 1e-9
+    curr_epsilon = max(value_range / scaling, epsilon)
+
+    candidates = None
+    if top_k is not None and top_k < num_slots:
+        candidates = np.argsort(-slot_valuations, axis=1)[:, :top_k]
+
+    prices = np.zeros(num_slots)
+    while True:
+        assignments, prices = run_phase(slot_valuations, prices, curr_epsilon,
+                                        candidates, max_rounds)
+        if np.any(assignments < 0):
+            raise SolverError(f"auction left {np.sum(assignments < 0)} agents "
+                              f"unassigned after {max_rounds} rounds")
+        if num_slots > n:
+            assignments, prices = run_reverse_phase(slot_valuations, prices, assignments,
+                                                    curr_epsilon, max_rounds)
+        if curr_epsilon <= epsilon:
+            break
+        curr_epsilon = max(curr_epsilon / scaling, epsilon)
+
+    # a room costs the most any of its slots does
+    room_prices = np.full(m, -np.inf)
+    np.maximum.at(room_prices, slot_rooms, prices)
+    return slot_rooms[assignments], room_prices
+
+
+def run_phase(valuations, prices, epsilon, candidates=None, max_rounds=1000000):
+    """
+    Runs one auction phase from the given prices until every agent is assigned,
+    or until max_rounds have passed, leaving the remaining agents at -1.
+    args:
+        valuations      (ndarray)   2D matrix of shape (n, m) of valuations
+        prices          (ndarray)   1D array of shape (m,) of starting prices
+        epsilon         (float)     the bid increment
+        candidates      (ndarray)   2D array of shape (n, k) of the rooms each
+                        agent bids for, None for all rooms
+        max_rounds      (int)       the maximum number of bidding rounds
+    returns:
+        assignments     (ndarray)   1D array of shape (n,) of assignments
+        prices          (ndarray)   1D array of shape (m,) of prices
+    """
+    n, m = valuations.shape
+    prices = prices.copy()
+    assignments = np.full(n, -1)
+    owners = np.full(m, -1)
+
+    # agents bidding over all rooms instead of their candidates, and the best 
+    # profit outside the candidates of the others
+    full = np.full(n, candidates is None)
+    outside = None
+    if candidates is not None:
+        profits = valuations - prices
+        profits[np.arange(n).reshape(-1, 1), candidates] = -np.inf
+        outside = np.max(profits, axis=1)
+
+    # the bid when an agent has a single room to choose from
+    max_increment = np.max(valuations) - np.min(valuations) + epsilon
+
+    for _ in range(max_rounds):
+        bidders = np.nonzero(assignments < 0)[0]
+        if len(bidders) == 0:
+            break
+
+        rooms, bids = get_bids(valuations, prices, epsilon, bidders, candidates,
+                               full, outside, max_increment)
+
+        # each room goes to its highest bidder
+        order = np.lexsort((-bids, rooms))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = rooms[order[1:]] != rooms[order[:-1]]
+        winners = order[first]
+        won_rooms = rooms[winners]
+
+        previous_owners = owners[won_rooms]
+        assignments[previous_owners[previous_owners >= 0]] = -1
+        owners[won_rooms] = bidders[winners]
+        assignments[bidders[winners]] = won_rooms
+        prices[won_rooms] = bids[winners]
+    return assignments, prices
+
+
+def run_reverse_phase(valuations, prices, assignments, epsilon, max_rounds=1000000):
+    """
+    Runs a reverse phase after a phase that assigned every agent, for instances 
+    with more slots than agents. In every round all unassigned slots priced above
+    the cheapest assigned slot bid at once for the agent to whom they offer the 
+    most profit, lowering their price to the gap to the second best agent minus
+    epsilon, but not below that lower bound, and each agent takes the best offer. 
+    A slot with nothing to offer drops to the lower bound instead. Agents only 
+    gain profit, so they remain within epsilon of their best slot.
+    args:
+        valuations      (ndarray)   2D matrix of shape (n, m) of valuations
+        prices          (ndarray)   1D array of shape (m,) of prices
+        assignments     (ndarray)   1D array of shape (n,) of assignments
+        epsilon         (float)     the bid increment
+        max_rounds      (int)       the maximum number of bidding rounds
+    returns:
+        assignments     (ndarray)   1D array of shape (n,) of assignments
+        prices          (ndarray)   1D array of shape (m,) of prices
+    raises:
+        SolverError     if a slot is still above the lower bound after max_rounds
+    """
+    n, m = valuations.shape
+    prices = prices.copy()
+    assignments = assignments.copy()
+    agents = np.arange(n)
+    owners = np.full(m, -1)
+    owners[assignments] = agents
+    profits = valuations[agents, assignments] - prices[assignments]
+    lower = np.min(prices[assignments])
+    max_increment = np.max(valuations) - np.min(valuations) + epsilon
+
+    for _ in range(max_rounds):
+        slots = np.flatnonzero((owners < 0) & (prices > lower))
+        if len(slots) == 0:
+            return assignments, prices
+
+        best_index, best, second = get_best_two((valuations[:, slots] - 
+                                                 profits[:, np.newaxis]).T, max_increment)
+        settled = best - epsilon <= lower
+        prices[slots[settled]] = lower
+        slots, best_index, second = slots[~settled], best_index[~settled], second[~settled]
+        bids = np.maximum(second - epsilon, lower)
+        offers = valuations[best_index, slots] - bids
+
+        # each agent goes to the slot offering it the most profit
+        order = np.lexsort((-offers, best_index))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = best_index[order[1:]] != best_index[order[:-1]]
+        winners = order[first]
+        won_agents = best_index[winners]
+
+        owners[assignments[won_agents]] = -1
+        owners[slots[winners]] = won_agents
+        assignments[won_agents] = slots[winners]
+        prices[slots[winners]] = bids[winners]
+        profits[won_agents] = offers[winners]
+    raise SolverError(f"reverse auction left {len(slots)} slots above the lower bound "
+                      f"after {max_rounds} rounds")
+
+
+def get_bids(valuations, prices, epsilon, bidders, candidates, full, outside,
+             max_increment):
+    """
+    Computes the room and bid of every bidder. Bidders whose candidates are all
+    worse than the bound outside them switch to bidding over all rooms.
+    returns:
+        rooms           (ndarray)   1D array of the room each bidder bids for
+        bids            (ndarray)   1D array of the price each bidder offers
+    """
+    rooms = np.zeros(len(bidders), dtype=int)
+    bids = np.zeros(len(bidders))
+
+    if candidates is not None:
+        mask = ~full[bidders]
+        agents = bidders[mask]
+        rooms_considered = candidates[agents]
+        values = valuations[agents.reshape(-1, 1), rooms_considered] - prices[rooms_considered]
+        best_index, best, second = get_best_two(values, max_increment)
+        second = np.maximum(second, outside[agents])
+
+        # bidders whose best room lies outside their candidates
+        switch = best < outside[agents]
+        full[agents[switch]] = True
+        bid_rooms = rooms_considered[np.arange(len(agents)), best_index]
+        rooms[np.nonzero(mask)[0][~switch]] = bid_rooms[~switch]
+        bids[np.nonzero(mask)[0][~switch]] = (prices[bid_rooms] + best - second + 
+                                              epsilon)[~switch]
+
+    mask = full[bidders]
+    if np.any(mask):
+        agents = bidders[mask]
+        values = valuations[agents] - prices
+        best_index, best, second = get_best_two(values, max_increment)
+        rooms[mask] = best_index
+        bids[mask] = prices[best_index] + best - second + epsilon
+    return rooms, bids
+
+
+def get_best_two(values, max_increment):
+    """
+    Finds the best and second best value in each row of values. With a single
+    column, the second best is max_increment below the best.
+    returns:
+        best_index      (ndarray)   1D array of the column of the best value
+        best            (ndarray)   1D array of the best values
+        second          (ndarray)   1D array of the second best values
+    """
+    rows = np.arange(values.shape[0])
+    best_index = np.argmax(values, axis=1)
+    best = values[rows, best_index]
+    if values.shape[1] == 1:
+        return best_index, best, best - max_increment
+    values = values.copy()
+    values[rows, best_index] = -np.inf
+    return best_index, best, np.max(values, axis=1)
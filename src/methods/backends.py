@@ -0,0 +1,179 @@
+"""
+Implements the solver backends that LPMethod can run on besides GLPK: HiGHS
+through scipy, and a pure numpy backend with the Hungarian algorithm for the
+assignments and a small simplex method for the pricing programs, for
+environments without a working cvxopt.glpk. Every backend is a SolverContext
+with the same lp and assign methods, so methods select one by name.
+"""
+
+import numpy as np
+
+from methods.hungarian import hungarian
+from methods.simplex import simplex
+from methods.solver import SolverContext, SolverError, build_assignment_program
+
+
+class HighsContext(SolverContext):
+    """
+    Solves the programs with the HiGHS solvers of scipy, linprog for linear
+    programs and milp for assignments, which need scipy 1.9 or later. scipy is
+    imported on first use.
+    """
+
+    def lp(self, c, G, h, A, b):
+        """
+        Solves the linear program of SolverContext.lp over free variables.
+        """
+        from scipy.optimize import linprog
+
+        result = linprog(c, A_ub=G, b_ub=h, A_eq=A, b_eq=b, bounds=(None, None),
+                         method="highs", options={"disp": self.verbosity >= 2})
+        if result.status != 0:
+            raise SolverError(f"linprog returned status {result.status}: "
+                              f"{result.message}")
+        # scipy's marginals are the sensitivities of the objective to the right
+        # hand sides, the negated duals of cvxopt
+        return ("optimal", result.x, -result.ineqlin.marginals,
+                -result.eqlin.marginals)
+
+    def assign(self, weights, capacities, bound=None):
+        """
+        Solves the assignment of SolverContext.assign as a mixed integer program.
+        """
+        from scipy.optimize import Bounds, LinearConstraint, milp
+        from scipy.sparse import coo_matrix
+
+        c, G, h, A, b = build_assignment_program(weights, capacities, bound)
+        G = coo_matrix((G[0], (G[1], G[2])), shape=(len(h), weights.size))
+        A = coo_matrix((A[0], (A[1], A[2])), shape=(len(b), weights.size))
+        result = milp(c, integrality=np.ones(weights.size), bounds=Bounds(0, 1),
+                      constraints=[LinearConstraint(G, -np.inf, h),
+                                   LinearConstraint(A, b, b)],
+                      options={"disp": self.verbosity >= 2})
+        if result.status != 0:
+            raise SolverError(f"milp returned status {result.status}: "
+                              f"{result.message}")
+        return np.argmax(result.x.reshape(weights.shape), axis=1)
+
+
+class NumpyContext(SolverContext):
+    """
+    Solves the programs in pure numpy. Linear programs are solved by a dense
+    simplex method, which suits the pricing programs of one household but not
+    large general programs. Assignments are solved by the Hungarian algorithm,
+    or, with a bound on a second set of weights, by branch and bound over the
+    simplex.
+    """
+
+    def lp(self, c, G, h, A, b):
+        """
+        Solves the linear program of SolverContext.lp.
+        """
+        x, z, y = simplex(c, G, h, A, b)
+        return "optimal", x, z, y
+
+    def assign(self, weights, capacities, bound=None):
+        """
+        Solves the assignment of SolverContext.assign.
+        """
+        if bound is None:
+            return hungarian(weights, capacities)
+        c, G, h, A, b = build_assignment_program(weights, capacities, bound)
+        G = to_dense(G, (len(h), weights.size))
+        A = to_dense(A, (len(b), weights.size))
+        x = branch_and_bound(c, G, h, A, b)
+        return np.argmax(x.reshape(weights.shape), axis=1)
+
+
+# backends by the name methods select them with
+BACKENDS = {"glpk": SolverContext, "highs": HighsContext, "numpy": NumpyContext}
+
+
+def get_context(backend="glpk", verbosity=1):
+    """
+    Returns the shared context of a backend.
+    args:
+        backend         (str)       "glpk", "highs" or "numpy"
+        verbosity       (int)       0=no output, 1=step output, 2=solver output
+    returns:
+        context         (SolverContext)
+    """
+    assert(backend in BACKENDS)
+    return BACKENDS[backend].get_default(verbosity)
+
+
+def is_available(backend):
+    """
+    Checks whether the solvers of a backend can be imported: cvxopt with GLPK
+    for "glpk" and scipy 1.9 or later for "highs". 
+    args:
+        backend         (str)       "glpk", "highs" or "numpy"
+    returns:
+        available       (bool)
+    """
+    assert(backend in BACKENDS)
+    try:
+        if backend == "glpk":
+            from cvxopt import glpk
+        elif backend == "highs":
+            from scipy.optimize import milp
+    except ImportError:
+        return False
+    return True
+
+
+def to_dense(entries, shape):
+    """
+    Builds a dense matrix from the values, rows and columns of its entries.
+    """
+    values, rows, columns = entries
+    matrix = np.zeros(shape)
+    np.add.at(matrix, (rows, columns), values)
+    return matrix
+
+
+def branch_and_bound(c, G, h, A, b, tolerance=1e-6):
+    """
+    Solves the binary program
+        minimize    c'x
+        subject to  Gx <= h
+                    Ax = b
+                    x binary
+    depth first, branching on the most fractional variable of each relaxation.
+    Assignment programs have integral relaxations, so with a single extra row
+    this rarely branches.
+    args:
+        c, G, h, A, b   (ndarray)   the program
+        tolerance       (float)     distance from 0 or 1 that counts as integral
+    returns:
+        x               (ndarray)   1D array, the solution
+    """
+    num_vars = len(c)
+    bounds = np.concatenate([np.eye(num_vars), -np.eye(num_vars)])
+    best_x, best_value = None, np.inf
+    # each node fixes some variables to 0 or 1, given as {index: value}
+    nodes = [{}]
+    while nodes:
+        fixed = nodes.pop()
+        indices = np.array(list(fixed.keys()), dtype=int)
+        values = np.array(list(fixed.values()), dtype=float)
+        try:
+            x, _, _ = simplex(c, np.concatenate([G, bounds]),
+                              np.concatenate([h, np.ones(num_vars), np.zeros(num_vars)]),
+                              np.concatenate([A, np.eye(num_vars)[indices]]),
+                              np.concatenate([b, values]))
+        except SolverError:
+            continue
+        value = np.dot(c, x)
+        if value >= best_value - tolerance:
+            continue
+        fractional = np.abs(x - np.round(x))
+        if np.max(fractional) <= tolerance:
+            best_x, best_value = np.round(x), value
+            continue
+        branch = int(np.argmax(fractional))
+        nodes.append({**fixed, branch: 0.0})
+        nodes.append({**fixed, branch: 1.0})
+    if best_x is None:
+        raise SolverError("branch and bound found the program infeasible")
+    return best_x
@@ -3,9 +3,6 @@ Implements same algorithm described in http://procaccia.info/papers/rent.pdf.
 """
 
 import numpy as np
-import cvxopt
-from cvxopt import matrix
-from cvxopt.solvers import lp
 
 from methods.lp_method import LPMethod
 
@@ -19,15 +16,16 @@ class MinMaxDemandMethod(LPMethod):
         self.assignemnts, self.prices = method.solve()
     """
 
-    def __init__(self, valuations, verbosity=1):
+    def __init__(self, valuations, verbosity=1, **kwargs):
         """
         Intializes the method. 
         args:
-            valuations      (ndarray)   2D matrix of shape (n, n) where position (i, j)
+            valuations      (ndarray)   2D matrix of shape (n, m) where position (i, j)
                             gives the valuation of agent i for room j. 
             verbosity       (int)       0=no output, 1=step output, 2=solver output
+            kwargs          (dict)      options passed to LPMethod, e.g. capacities
         """
-        super().__init__(valuations, verbosity)
+        super().__init__(valuations, verbosity, **kwargs)
         
     def solve_prices(self):
         """
@@ -39,9 +37,16 @@ class MinMaxDemandMethod(LPMethod):
                                 is the price for room i. 
         """
         # objective function, minimum is stored at last index [-1]
-        c = np.zeros((self.n + 1, 1))
+        c = np.zeros((self.m + 1, 1))
         c[-1, 0] = 1
 
+        # the optimum without envy-freeness constraints solves the program 
+        # when it is envy-free
+        prices = self.solve_relaxed_prices(np.mean(self.valuations, axis=0))
+        if prices is not None:
+            self.prices = prices
+            return self.prices
+
         # inqueality constraints
         all_G = []
         all_h = []
@@ -50,7 +55,7 @@ class MinMaxDemandMethod(LPMethod):
         for agent_id in range(self.n):
             assigned_room = self.assignments[agent_id]
 
-            g = np.zeros(self.n + 1)
+            g = np.zeros(self.m + 1)
             g[-1] = -1
             g[assigned_room] = 1
             
@@ -60,32 +65,15 @@ class MinMaxDemandMethod(LPMethod):
             all_h.append(h)
         
         # ensure envy-freeness 
-        for agent_id in range(self.n):
-            assigned_room = self.assignments[agent_id]
-            for other_room in range(self.n):
-                if other_room == assigned_room:
-                    continue
-                g = np.zeros(self.n + 1)
-                g[assigned_room] = 1.0
-                g[other_room] = -1.0
-
-                h = (self.valuations[agent_id, assigned_room] - 
-                     self.valuations[agent_id, other_room])
-                
-                all_G.append(g)
-                all_h.append(h)
-        G = np.stack(all_G, axis=0)
-        h = np.stack(all_h, axis=0)
+        envy_G, envy_h = self.build_envy_constraints()
+        G = np.concatenate([np.stack(all_G, axis=0), envy_G], axis=0)
+        h = np.concatenate([np.stack(all_h, axis=0), envy_h], axis=0)
 
         # ensure prices sum to 1
-        A = np.ones((1, self.n + 1))
-        A[0, -1] = 0 
-        b = np.ones((1, 1))
+        A, b = self.build_rent_constraint()
 
         # solve program
-        solution = lp(matrix(c, tc='d'), matrix(G, tc='d'), 
-                      matrix(h, tc='d'), matrix(A, tc='d'), 
-                      matrix(b, tc='d'), solver='glpk')
-        self.prices = np.array(solution['x']).squeeze()[:self.n]
+        status, x, z, y = self.context.lp(c, G, h, A, b)
+        self.prices = x[:self.m]
 
         return self.prices
\ No newline at end of file
@@ -0,0 +1,163 @@
+"""
+Implements vectorized operations on the envy graph of batches of rent-splitting
+instances. The envy-freeness constraints of a fixed assignment are difference
+constraints
+    p[assigned_room] - p[other_room] <= scale[agent] * (v[agent, assigned_room] -
+                                                       v[agent, other_room])
+so they are feasible iff the graph with an edge from other_room to assigned_room
+of that weight has no negative cycle. The rent constraint does not change this,
+since adding a constant to all prices keeps every difference constraint.
+"""
+
+import itertools
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+
+def solve_assignments_batch(valuations, max_enumerated=7):
+    """
+    Solves the welfare-maximizing assignment for a batch of square instances. 
+    Small instances are solved at once by enumerating all n! matchings, which 
+    takes memory of b * n!, so larger ones are solved one at a time with 
+    scipy's linear_sum_assignment.
+    args:
+        valuations      (ndarray)   3D array of shape (b, n, n) of valuations
+        max_enumerated  (int)       the largest n whose matchings are enumerated
+    returns:
+        assignments     (ndarray)   2D array of shape (b, n) of assignments
+    """
+    n = valuations.shape[1]
+    if n > max_enumerated:
+        assignments = np.zeros(valuations.shape[:2], dtype=int)
+        for instance_id, instance in enumerate(valuations):
+            assignments[instance_id] = linear_sum_assignment(-instance)[1]
+        return assignments
+
+    permutations = np.array(list(itertools.permutations(range(n))))
+    welfare = np.zeros((valuations.shape[0], len(permutations)))
+    for agent_id in range(n):
+        welfare += valuations[:, agent_id, permutations[:, agent_id]]
+    return permutations[np.argmax(welfare, axis=1)]
+
+
+def build_envy_graph(valuations, assignments, scale=None):
+    """
+    Builds the weights of the envy graph over rooms for a batch of instances.
+    The weight from room j to room r bounds p[r] - p[j] and is infinite when
+    no agent is assigned to r.
+    args:
+        valuations      (ndarray)   3D array of shape (b, n, m) of valuations
+        assignments     (ndarray)   2D array of shape (b, n) of assignments
+        scale           (ndarray)   2D array of shape (b, n) scaling each agent's
+                        valuation differences. Defaults to ones.
+    returns:
+        weights         (ndarray)   3D array of shape (b, m, m)
+    """
+    num_instances, n, m = valuations.shape
+    batch = np.arange(num_instances).reshape(-1, 1)
+    assigned = np.take_along_axis(valuations, assignments[:, :, np.newaxis], axis=2)
+    differences = assigned - valuations
+    if scale is not None:
+        differences = differences * scale[:, :, np.newaxis]
+
+    # weights_t[b, r, j] is the weight of the edge from j to r, the minimum
+    # over all agents assigned to r
+    weights_t = np.full((num_instances, m, m), np.inf, dtype=differences.dtype)
+    np.minimum.at(weights_t, (batch, assignments), differences)
+    weights = weights_t.transpose(0, 2, 1).copy()
+    diagonal = np.arange(m)
+    weights[:, diagonal, diagonal] = np.minimum(weights[:, diagonal, diagonal], 0)
+    return weights
+
+
+def get_shortest_paths(weights):
+    """
+    Computes all-pairs shortest paths for a batch of graphs with Floyd-Warshall,
+    vectorized over the batch.
+    args:
+        weights         (ndarray)   3D array of shape (b, m, m) of edge weights
+    returns:
+        distances       (ndarray)   3D array of shape (b, m, m) of path lengths
+    """
+    distances = weights.copy()
+    for k in range(distances.shape[1]):
+        np.minimum(distances, distances[:, :, k:k + 1] + distances[:, k:k + 1, :],
+                   out=distances)
+    return distances
+
+
+def get_potentials(weights):
+    """
+    Computes for a batch of graphs without negative cycles the shortest path 
+    lengths from a virtual source with a zero edge to every node, with 
+    Bellman-Ford vectorized over the batch. The lengths p satisfy 
+    p[r] - p[j] <= weights[j, r] for every edge, so on an envy graph they are 
+    envy-free prices, the highest such prices that are at most zero. 
+    args:
+        weights         (ndarray)   3D array of shape (b, m, m) of edge weights
+    returns:
+        potentials      (ndarray)   2D array of shape (b, m) 
+    """
+    potentials = np.zeros(weights.shape[:2])
+    for _ in range(weights.shape[1]):
+        updated = np.minimum(potentials, 
+                             np.min(potentials[:, :, np.newaxis] + weights, axis=1))
+        if np.array_equal(updated, potentials):
+            break
+        potentials = updated
+    return potentials
+
+
+def has_tight_cycle(weights, tolerance=1e-9):
+    """
+    Checks for a batch of graphs without negative cycles whether some cycle, other
+    than a self loop, weighs at most tolerance. Under the shortest path potentials
+    every edge has a nonnegative reduced weight, and a cycle weighs as much as its
+    reduced weights, so it is enough to look for a cycle among the edges of 
+    reduced weight at most tolerance. These are pruned of nodes without incoming
+    edges until no such node is left. On an envy graph, such a cycle moves agents
+    between rooms without losing welfare. 
+    args:
+        weights         (ndarray)   3D array of shape (b, m, m) of edge weights
+        tolerance       (float)     reduced weight that counts as zero
+    returns:
+        has_cycle       (ndarray)   1D boolean array of shape (b,)
+    """
+    potentials = get_potentials(weights)
+    reduced = weights + potentials[:, :, np.newaxis] - potentials[:, np.newaxis, :]
+    tight = reduced <= tolerance
+    diagonal = np.arange(weights.shape[1])
+    tight[:, diagonal, diagonal] = False
+
+    remaining = np.ones(weights.shape[:2], dtype=bool)
+    while True:
+        in_degrees = np.sum(tight & remaining[:, :, np.newaxis], axis=1)
+        sources = remaining & (in_degrees == 0)
+        if not np.any(sources):
+            return np.any(remaining, axis=1)
+        remaining &= ~sources
+
+
+def check_feasibility(valuations, scale=None, tolerance=1e-9):
+    """
+    Checks for a batch of square instances whether envy-free prices exist for the
+    welfare-maximizing assignment of the scaled valuations, without solving an LP.
+    args:
+        valuations      (ndarray)   3D array of shape (b, n, n) of valuations
+        scale           (ndarray)   2D array of shape (b, n) scaling each agent's
+                        valuations, e.g. 2 * priorities. Defaults to ones.
+        tolerance       (float)     cycle weight below -tolerance counts as negative.
+                        Raised to the rounding error of a cycle for float32 input.
+    returns:
+        feasible        (ndarray)   1D boolean array of shape (b,)
+    """
+    tolerance = max(tolerance, valuations.shape[2] * np.finfo(valuations.dtype).eps)
+    welfare_valuations = valuations
+    if scale is not None:
+        scale = scale.astype(valuations.dtype, copy=False)
+        welfare_valuations = valuations * scale[:, :, np.newaxis]
+    assignments = solve_assignments_batch(welfare_valuations)
+    distances = get_shortest_paths(build_envy_graph(valuations, assignments, scale))
+    diagonal = np.arange(valuations.shape[2])
+    return np.all(distances[:, diagonal, diagonal] >= -tolerance, axis=1)
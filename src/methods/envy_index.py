@@ -0,0 +1,166 @@
+"""
+Implements an index of one household's envy graph, so that questions about its
+envy-free prices are answered by lookups instead of solving programs.
+"""
+
+import numpy as np
+
+from methods.demand import MinMaxDemandMethod
+from methods.envy_graph import build_envy_graph, get_shortest_paths
+from methods.lp_method import LPMethod
+from methods.price import MaxMinPriceMethod, MinMaxPriceMethod
+from methods.slack import MaxMinSlackMethod
+from methods.utility import MaxMinUtilityMethod
+
+
+class EnvyIndex():
+    """
+    Solves the welfare-maximizing assignment of a household once, along with the
+    shortest paths of its envy graph and the prices of each method for that
+    assignment. The envy-free prices are exactly those with
+        p[r] - p[j] <= distances[j, r]
+    for all rooms j and r, so with the rent fixed, each room's price ranges over
+    an interval given by a sum over one row or column of distances.
+    Example usage:
+        index = EnvyIndex(valuations, agents=["Sabri", "Kye", "KiJung"],
+                          total_rent=3000)
+        low, high = index.get_price_interval(room=0)
+        method_name = index.get_cheapest_method("Kye")
+    """
+
+    def __init__(self, valuations, capacities=None, method_classes=None, agents=None,
+                 total_rent=1.0, tolerance=1e-9, backend="glpk"):
+        """
+        Builds the index.
+        args:
+            valuations      (ndarray)   2D matrix of shape (n, m) where position (i, j)
+                            gives the valuation of agent i for room j, summing to
+                            1 for each agent
+            capacities      (ndarray)   1D array of shape (m,) giving the number of
+                            agents each room holds. Defaults to one per room.
+            method_classes  (list)      classes of Method type to price the
+                            assignment with. Defaults to all methods that take
+                            only valuations.
+            agents          (list)      names of the agents, defaults to 0 to n - 1
+            total_rent      (float)     the rent that prices are reported in
+            tolerance       (float)     welfare difference that counts as neutral
+            backend         (str)       the solver of the assignment and the 
+                            methods, "glpk", "highs" or "numpy", see methods.backends
+        """
+        self.valuations = np.asarray(valuations, dtype=float)
+        self.n, self.m = self.valuations.shape
+        self.agents = list(range(self.n)) if agents is None else list(agents)
+        self.total_rent = total_rent
+        self.tolerance = tolerance
+        if method_classes is None:
+            method_classes = [MaxMinUtilityMethod, MinMaxPriceMethod, MaxMinPriceMethod,
+                              MinMaxDemandMethod, MaxMinSlackMethod]
+
+        method = LPMethod(self.valuations, verbosity=0, capacities=capacities,
+                          backend=backend)
+        self.assignments = method.solve_assignments()
+        self.occupancy = method.get_occupancy()
+        self.distances = get_shortest_paths(
+            build_envy_graph(self.valuations[np.newaxis], self.assignments[np.newaxis]))[0]
+        self.price_bounds = self.build_price_bounds()
+        self.neutral_swaps = self.build_neutral_swaps()
+
+        # prices of every method for the shared assignment, in units of rent
+        self.method_prices = {}
+        for method_class in method_classes:
+            method = method_class(self.valuations, verbosity=0, capacities=capacities,
+                                  backend=backend)
+            method.assignments = self.assignments
+            self.method_prices[method_class.__name__] = method.solve_prices() * total_rent
+
+    def build_price_bounds(self):
+        """
+        Computes the lowest and highest envy-free price of each room. Raising room
+        r to p forces every room j to at least p - distances[j, r], so with the
+        rent fixed
+            max p[r] = (1 + sum_j occupancy[j] * distances[j, r]) / n
+            min p[r] = (1 - sum_j occupancy[j] * distances[r, j]) / n
+        Empty rooms have no upper bound.
+        returns:
+            bounds          (ndarray)   2D array of shape (m, 2) of the lowest and
+                            highest price, in units of rent
+        """
+        occupied = self.occupancy > 0
+        lower = (1 - np.dot(self.distances[:, occupied], self.occupancy[occupied])) / self.n
+        upper = (1 + np.dot(self.occupancy[occupied], self.distances[occupied, :])) / self.n
+        upper[~occupied] = np.inf
+        return np.stack([lower, upper], axis=1) * self.total_rent
+
+    def build_neutral_swaps(self):
+        """
+        Finds the pairs of agents in different rooms who can swap rooms without
+        changing the total welfare, i.e. the other optimal assignments one swap
+        away.
+        returns:
+            swaps           (ndarray)   2D boolean matrix of shape (n, n)
+        """
+        rows = np.arange(self.n)
+        own = self.valuations[rows, self.assignments]
+        # swapped[i, k] is the valuation of agent i for the room of agent k
+        swapped = self.valuations[:, self.assignments]
+        loss = own.reshape(-1, 1) + own - swapped - swapped.T
+        return ((np.abs(loss) <= self.tolerance) &
+                (self.assignments.reshape(-1, 1) != self.assignments))
+
+    def get_agent_id(self, agent):
+        """
+        Returns the row of agent, given by name or row.
+        """
+        if agent in self.agents:
+            return self.agents.index(agent)
+        return int(agent)
+
+    def get_price_interval(self, room):
+        """
+        Returns the lowest and highest envy-free price of room, in units of rent.
+        """
+        return float(self.price_bounds[room, 0]), float(self.price_bounds[room, 1])
+
+    def get_agent_price_interval(self, agent):
+        """
+        Returns the lowest and highest envy-free price agent can pay, in units
+        of rent.
+        """
+        return self.get_price_interval(self.assignments[self.get_agent_id(agent)])
+
+    def get_neutral_swaps(self, agent):
+        """
+        Returns the agents that agent can swap rooms with without changing the
+        total welfare.
+        """
+        swaps = self.neutral_swaps[self.get_agent_id(agent)]
+        return [self.agents[k] for k in np.nonzero(swaps)[0]]
+
+    def get_prices(self, method_name):
+        """
+        Returns the prices of method_name for the assignment, in units of rent.
+        """
+        return self.method_prices[method_name]
+
+    def get_agent_prices(self, agent):
+        """
+        Returns the price agent pays under each method, in units of rent.
+        """
+        room = self.assignments[self.get_agent_id(agent)]
+        return {method_name: float(prices[room])
+                for method_name, prices in self.method_prices.items()}
+
+    def get_cheapest_method(self, agent):
+        """
+        Returns the name of the method under which agent pays the least.
+        """
+        agent_prices = self.get_agent_prices(agent)
+        return min(agent_prices, key=agent_prices.get)
+
+    def is_envy_free(self, prices):
+        """
+        Checks whether prices, in units of rent, are envy-free for the assignment.
+        """
+        prices = np.asarray(prices) / self.total_rent
+        differences = prices.reshape(1, -1) - prices.reshape(-1, 1)
+        return bool(np.all(differences <= self.distances + self.tolerance))
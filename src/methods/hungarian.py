@@ -0,0 +1,75 @@
+"""
+Implements the Hungarian algorithm for the welfare-maximizing assignment in pure
+numpy, in its shortest augmenting path form with row and column potentials. See
+https://en.wikipedia.org/wiki/Hungarian_algorithm for details.
+"""
+
+import numpy as np
+
+
+def hungarian(weights, capacities=None):
+    """
+    Assigns rooms to agents maximizing the total weight. Agents are added one at
+    a time, each by the shortest augmenting path in the reduced costs, which is
+    grown by a vectorized scan over all rooms, so the assignment is exact and
+    takes O(n^2 m) time.
+    args:
+        weights         (ndarray)   2D matrix of shape (n, m) where position (i, j)
+                        gives the weight of agent i for room j
+        capacities      (ndarray)   1D array of shape (m,) giving the number of
+                        agents each room holds. Defaults to one per room.
+    returns:
+        assignments     (ndarray)   1D array of shape (n,) of assignments
+    """
+    n, m = weights.shape
+    if capacities is None:
+        capacities = np.ones(m, dtype=int)
+    capacities = np.asarray(capacities, dtype=int)
+    assert(np.sum(capacities) >= n)
+
+    # rooms that hold several agents are split into one slot per agent
+    slot_rooms = np.repeat(np.arange(m), capacities)
+    costs = -np.asarray(weights, dtype=float)[:, slot_rooms]
+    num_slots = len(slot_rooms)
+
+    # slot 0 is a virtual slot that holds the agent being added, agents are
+    # numbered from 1 so that 0 marks a free slot
+    row_potentials = np.zeros(n + 1)
+    slot_potentials = np.zeros(num_slots + 1)
+    slot_agents = np.zeros(num_slots + 1, dtype=int)
+    previous = np.zeros(num_slots + 1, dtype=int)
+    for agent in range(1, n + 1):
+        slot_agents[0] = agent
+        curr_slot = 0
+        distances = np.full(num_slots + 1, np.inf)
+        visited = np.zeros(num_slots + 1, dtype=bool)
+        while True:
+            visited[curr_slot] = True
+            curr_agent = slot_agents[curr_slot]
+            reduced = (costs[curr_agent - 1] - row_potentials[curr_agent] -
+                       slot_potentials[1:])
+            closer = ~visited[1:] & (reduced < distances[1:])
+            distances[1:][closer] = reduced[closer]
+            previous[1:][closer] = curr_slot
+
+            unvisited = np.flatnonzero(~visited[1:]) + 1
+            next_slot = unvisited[np.argmin(distances[unvisited])]
+            delta = distances[next_slot]
+            row_potentials[slot_agents[visited]] += delta
+            slot_potentials[visited] -= delta
+            distances[~visited] -= delta
+
+            curr_slot = next_slot
+            if slot_agents[curr_slot] == 0:
+                break
+
+        # flip the augmenting path back to the virtual slot
+        while curr_slot != 0:
+            prev_slot = previous[curr_slot]
+            slot_agents[curr_slot] = slot_agents[prev_slot]
+            curr_slot = prev_slot
+
+    assignments = np.zeros(n, dtype=int)
+    filled = np.flatnonzero(slot_agents[1:]) + 1
+    assignments[slot_agents[filled] - 1] = slot_rooms[filled - 1]
+    return assignments
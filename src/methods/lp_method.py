@@ -2,11 +2,13 @@
 Implements framework for solving rent-splitting problems witrh linear program. 
 """
 
+import time
+
 import numpy as np
-import cvxopt
-from cvxopt import matrix
-from cvxopt.glpk import ilp
-from cvxopt.solvers import lp
+
+from methods.auction import auction
+from methods.backends import get_context
+from methods.envy_graph import build_envy_graph, get_potentials, has_tight_cycle
 
 
 class LPMethod():
@@ -18,20 +20,50 @@ class LPMethod():
         self.assignemnts, self.prices = method.solve()
     """
 
-    def __init__(self, valuations, verbosity=1):
+    def __init__(self, valuations, verbosity=1, capacities=None, context=None,
+                 assignment_method="ilp", auction_top_k=None, tiebreak=None,
+                 backend="glpk"):
         """
         Intializes the method. 
         args:
-            valuations      (ndarray)   2D matrix of shape (n, n) where position (i, j)
-                            gives the valuation of agent i for room j. 
+            valuations      (ndarray)   2D matrix of shape (n, m) where position (i, j)
+                            gives the valuation of agent i for room j. There may
+                            be more rooms than agents. 
             verbosity       (int)       0=no output, 1=step output, 2=solver output
+            capacities      (ndarray)   1D array of shape (m,) giving the number of
+                            agents each room holds. Defaults to one per room. 
+            context         (SolverContext) solver options and buffers to reuse
+                            across methods. Defaults to a shared context. 
+            assignment_method   (str)   "ilp" to solve the assignments with the glpk
+                                binary linear program solver, "auction" to use the
+                                auction algorithm, which also yields room prices
+            auction_top_k   (int)       the number of candidate rooms per agent in 
+                            the auction, None for all rooms
+            tiebreak        (RandomState) if set, ties between welfare-maximizing
+                            assignments are broken by random priorities drawn
+                            from it, or from a RandomState seeded with it if it is
+                            a seed. Otherwise the solver's assignment is kept. 
+            backend         (str)       the solver used without a context, "glpk",
+                            "highs" or "numpy", see methods.backends
         """
         self.verbosity = verbosity
-        if self.verbosity <= 1:
-            self.silence()
+        self.assignment_method = assignment_method
+        self.auction_top_k = auction_top_k
+        self.assignment_prices = None
+        if tiebreak is not None and not isinstance(tiebreak, np.random.RandomState):
+            tiebreak = np.random.RandomState(tiebreak)
+        self.tiebreak = tiebreak
+        if context is None:
+            context = get_context(backend, verbosity)
+        self.context = context
 
         self.valuations = valuations
-        self.n = self.valuations.shape[0]
+        self.n, self.m = self.valuations.shape
+        if capacities is None:
+            capacities = np.ones(self.m)
+        self.capacities = np.asarray(capacities)
+        assert(len(self.capacities) == self.m)
+        assert(np.sum(self.capacities) >= self.n)
     
     def log(self, msg, level=1):
         """
@@ -54,23 +86,20 @@ class LPMethod():
                                 agent with agent id i. 
             self.prices         (ndarray)   1D array of prices. self.price[i]
                                 is the price for room i. 
+        The seconds spent on each step are kept in self.timings.
         """
+        start = time.perf_counter()
         self.log("Solving Assignment...")
         self.solve_assignments()
         self.log("Done.")
+        assigned = time.perf_counter()
         self.log("Solving Prices...")
         self.solve_prices()
         self.log("Done.")
+        self.timings = {"assignment": assigned - start, 
+                        "prices": time.perf_counter() - assigned}
         return self.assignments, self.prices
 
-    def silence(self):
-        """
-        """
-        cvxopt.solvers.options['msg_levl'] = 'GLP_MSG_OFF'
-        cvxopt.solvers.options['show_progress'] = False
-        cvxopt.solvers.options['LPX_K_MSGLEV'] = 0
-        cvxopt.glpk.options['msg_lev'] = 'GLP_MSG_OFF'
- 
     def solve_assignments(self):
         """
         Assigns rooms to agents by solving a binary linear program that
@@ -82,33 +111,232 @@ class LPMethod():
                                 self.assignments[i] is the assignment for 
                                 agent with agent id i. 
         """
-        # build valuations vector 
-        c = -1 * self.valuations.flatten()
-
-        # empty G and h, no inequality constraints
-        G = np.zeros((1, self.n**2))
-        h = np.zeros((1))
-
-        # build A and b, enforces unique room-agent matching
-        A = np.zeros((2 * self.n, self.n**2))
-        b = np.ones((2 * self.n))
-        for i in range(self.n):
-            # exactly one room per agent
-            A[i, i * self.n + np.arange(self.n)] = 1.0 
-            # exactyly one agent per room
-            A[self.n + i, (self.n) * np.arange(self.n) + i] = 1.0
+        if self.assignment_method == "auction":
+            return self.solve_assignments_auction()
+        self.assignment_prices = None
+        self.assignments = self.solve_matching(self.get_welfare_valuations())
+        if self.tiebreak is not None:
+            self.break_ties()
+        return self.assignments
 
-        B = set(range(self.n**2))
-        status, x = ilp(c=matrix(c, tc='d'), G=matrix(G, tc='d'), 
-                        h=matrix(h, tc='d'), A=matrix(A, tc='d'), 
-                        b=matrix(b, tc='d'), B=B)
+    def solve_matching(self, weights, min_welfare=None):
+        """
+        Assigns each agent one room, within the capacities, maximizing the total
+        weight, with the backend of the context. 
+        args:
+            weights         (ndarray)   2D matrix of shape (n, m) of the weight of
+                            each (agent, room) pair
+            min_welfare     (float)     if set, only assignments whose total welfare
+                            valuation is at least min_welfare are allowed
+        returns:
+            assignments     (ndarray)   1D array of shape (n,) of rooms
+        """
+        bound = None
+        if min_welfare is not None:
+            bound = (self.get_welfare_valuations(), min_welfare)
+        return self.context.assign(weights, self.capacities, bound)
 
-        # get assignments
-        x = np.argmax(np.array(x).reshape(self.n, self.n), axis=1)
-        self.assignments = x 
+    def break_ties(self, tolerance=1e-9):
+        """
+        Replaces the assignments by the welfare-maximizing assignment with the 
+        highest total of random (agent, room) priorities drawn from self.tiebreak,
+        so that the assignment no longer depends on which optimum the solver 
+        happens to return. Another welfare-maximizing assignment moves agents 
+        along a cycle of rooms, or along a path from a room with spare capacity,
+        without losing welfare, so the second program is skipped if the envy graph
+        has no such cycle or path of zero weight. 
+        args:
+            tolerance       (float)     welfare difference that counts as a tie
+        returns:
+            self.assignments    (ndarray)   1D array of assignments. 
+        """
+        # drawn before any early return, so the random state advances the same
+        # whether or not there are ties
+        priorities = self.tiebreak.uniform(0, 1, size=(self.n, self.m))
+        valuations = self.get_welfare_valuations()
+        weights = build_envy_graph(valuations[np.newaxis], self.assignments[np.newaxis])[0]
+        # a path from a room with spare capacity to an occupied room is closed 
+        # into a cycle by a zero edge back to the spare room
+        counts = np.bincount(self.assignments, minlength=self.m)
+        occupied = np.flatnonzero(counts > 0)
+        spare = np.flatnonzero(counts < self.capacities)
+        weights[np.ix_(occupied, spare)] = np.minimum(weights[np.ix_(occupied, spare)], 0)
+        if not has_tight_cycle(weights[np.newaxis], tolerance)[0]:
+            return self.assignments
 
+        welfare = np.sum(valuations[np.arange(self.n), self.assignments])
+        self.assignments = self.solve_matching(priorities, min_welfare=welfare - tolerance)
+        self.assignment_prices = None
         return self.assignments
         
+    def solve_assignments_auction(self):
+        """
+        Assigns rooms to agents with the auction algorithm, which scales to large
+        instances. The final auction prices support the assignment, so they
+        satisfy the envy-freeness constraints of the welfare valuations up to the
+        auction's epsilon, and are kept in self.assignment_prices as a starting 
+        point for solve_prices. 
+        returns:
+            self.assignments    (ndarray)   1D array of assignments. 
+                                self.assignments[i] is the assignment for 
+                                agent with agent id i. 
+        """
+        self.assignments, self.assignment_prices = auction(self.get_welfare_valuations(),
+                                                           self.capacities,
+                                                           top_k=self.auction_top_k)
+        return self.assignments
+
+    def get_assignment_prices(self):
+        """
+        Returns prices supporting the assignments under the welfare valuations: 
+        every agent weakly prefers its own room, so they satisfy the 
+        envy-freeness constraints up to a constant. These are the dual variables 
+        of the capacity constraints of the assignment program. glpk returns no 
+        duals for binary programs, so unless the auction already produced 
+        prices, they are computed as shortest path lengths in the envy graph 
+        of the assignments, which has no negative cycle since they maximize 
+        welfare. 
+        returns:
+            self.assignment_prices  (ndarray)   1D array of shape (m,) of prices
+        """
+        if self.assignment_prices is None:
+            weights = build_envy_graph(self.get_welfare_valuations()[np.newaxis], 
+                                       self.assignments[np.newaxis])
+            self.assignment_prices = get_potentials(weights)[0]
+        return self.assignment_prices
+
+    def get_welfare_valuations(self):
+        """
+        Returns the valuations whose sum is maximized when solving for the 
+        assignments. Subclasses that weight agents differently override this.
+        returns:
+            valuations      (ndarray)   2D matrix of shape (n, m)
+        """
+        return self.valuations
+
+    def get_occupancy(self):
+        """
+        Counts the agents assigned to each room. 
+        returns:
+            occupancy       (ndarray)   1D array of shape (m,)
+        """
+        return np.bincount(self.assignments, minlength=self.m)
+
+    def build_envy_constraints(self, scale=None, mask=None):
+        """
+        Builds the envy-freeness constraints for the current assignments, one
+        row per agent and room other than the agent's own:
+            p[assigned_room] - p[other_room] <= 
+                scale[agent] * (v[agent, assigned_room] - v[agent, other_room])
+        The last column is reserved for the auxiliary objective variable.
+        args:
+            scale           (ndarray)   1D array of shape (n,) scaling each agent's 
+                            valuation differences. Defaults to ones. 
+            mask            (ndarray)   2D boolean matrix of shape (n, m) selecting
+                            the (agent, room) pairs to build rows for. Defaults 
+                            to all pairs. 
+        returns:
+            G               (ndarray)   2D matrix of shape (k, m + 1), k <= n * (m - 1)
+            h               (ndarray)   1D array of shape (k,)
+        """
+        if scale is None:
+            scale = np.ones(self.n)
+        pairs = np.arange(self.m) != self.assignments.reshape(-1, 1)
+        if mask is not None:
+            pairs &= mask
+        agents, rooms = np.nonzero(pairs)
+        assigned_rooms = self.assignments[agents]
+
+        G = np.zeros((len(agents), self.m + 1))
+        G[np.arange(len(agents)), assigned_rooms] = 1.0
+        G[np.arange(len(agents)), rooms] = -1.0
+        h = scale[agents] * (self.valuations[agents, assigned_rooms] - 
+                             self.valuations[agents, rooms])
+        return G, h
+
+    def get_envy(self, prices, scale=None):
+        """
+        Computes how much each agent would gain by moving to each room at 
+        prices. The assignment is envy-free iff no entry is positive. 
+        args:
+            prices          (ndarray)   1D array of shape (m,) of room prices
+            scale           (ndarray)   1D array of shape (n,) scaling each agent's 
+                            valuations. Defaults to ones. 
+        returns:
+            envy            (ndarray)   2D matrix of shape (n, m) 
+        """
+        valuations = self.valuations
+        if scale is not None:
+            valuations = valuations * scale.reshape(-1, 1)
+        utilities = (valuations[np.arange(self.n), self.assignments] - 
+                     prices[self.assignments])
+        return valuations - prices - utilities.reshape(-1, 1)
+
+    def get_noise_radius(self, prices=None):
+        """
+        Certifies how much the valuations may be off while the split stays 
+        envy-free. If no valuation moves by more than r, no agent's envy for 
+        another room moves by more than 2r, so the split stays envy-free for any
+        r up to half the smallest envy slack. 
+        args:
+            prices          (ndarray)   1D array of shape (m,) of room prices. 
+                            Defaults to self.prices. 
+        returns:
+            radius          (float)     the largest tolerated error in any single 
+                            valuation, 0 if the split is not envy-free
+        """
+        if prices is None:
+            prices = self.prices
+        envy = self.get_envy(prices)
+        envy[np.arange(self.n), self.assignments] = -np.inf
+        return max(-np.max(envy) / 2, 0)
+
+    def solve_relaxed_prices(self, offsets, scale=None, tolerance=1e-9):
+        """
+        Solves the pricing problem without the envy-freeness constraints, for 
+        objectives that bound the price of every occupied room minus its offset, 
+        e.g. the minimum utility or the maximum price. Since the rent is fixed, 
+        the optimum shifts all occupied rooms from their offsets by the same 
+        amount. If these prices are envy-free they also solve the full problem, 
+        so the program need not be solved. Empty rooms get the lowest price 
+        nobody envies. 
+        args:
+            offsets         (ndarray)   1D array of shape (m,) of room offsets
+            scale           (ndarray)   1D array of shape (n,) scaling each agent's 
+                            valuations in the envy-freeness constraints
+            tolerance       (float)     envy tolerated at the relaxed prices
+        returns:
+            prices          (ndarray)   1D array of shape (m,) of prices, None if 
+                            they are not envy-free
+        """
+        occupancy = self.get_occupancy()
+        occupied = occupancy > 0
+        prices = np.zeros(self.m)
+        prices[occupied] = (offsets[occupied] + 
+                            (1 - np.dot(occupancy, np.where(occupied, offsets, 0))) / self.n)
+        if not np.all(occupied):
+            envy = self.get_envy(prices, scale)
+            prices[~occupied] = np.max(envy[:, ~occupied], axis=0)
+
+        if np.max(self.get_envy(prices, scale)) > tolerance:
+            return None
+        self.log("Relaxed prices are envy-free.", level=2)
+        return prices
+
+    def build_rent_constraint(self):
+        """
+        Builds the equality constraint that the rent paid by all agents sums to 1. 
+        Each agent pays the price of its room, so room prices are weighted by 
+        occupancy. 
+        returns:
+            A               (ndarray)   2D matrix of shape (1, m + 1)
+            b               (ndarray)   2D matrix of shape (1, 1)
+        """
+        A = np.zeros((1, self.m + 1))
+        A[0, :self.m] = self.get_occupancy()
+        b = np.ones((1, 1))
+        return A, b
+
     def solve_prices(self):
         """
         Assigns prices to the already assigned rooms by maximizing the minimum 
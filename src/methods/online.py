@@ -0,0 +1,388 @@
+"""
+Implements a session that keeps the split of a building current while agents and
+rooms come and go, by repairing the welfare-maximizing assignment with augmenting
+paths instead of solving it again.
+"""
+
+import numpy as np
+
+from methods.solver import SolverError
+from methods.utility import MaxMinUtilityMethod
+
+
+class OnlineSession():
+    """
+    Keeps the welfare-maximizing assignment and envy-free prices of a building
+    current under a stream of events. The assignment is kept with the potentials
+    of the Hungarian algorithm: an agent potential u[k] and a slot potential v[s]
+    for every place in a room, with
+        u[k] + v[s] <= -valuations[k, room of s]
+    for all agents and slots, equality where the agent holds the slot, and v = 0
+    on free slots, which proves the assignment maximizes welfare. The negated
+    slot potentials are envy-free prices, shifted so that they sum to the rent.
+
+    An arriving agent is placed by one shortest augmenting path, which only
+    visits and reprices the slots it passes through. A departure or a new room
+    leaves a free slot whose price must fall to zero, and it is filled by one
+    shortest alternating path instead, if an agent prefers it before then.
+    Valuations are in units of rent and need not sum to the rent, since the
+    rooms change.
+    Example usage:
+        session = OnlineSession(total_rent=3000)
+        session.add_room("A")
+        session.add_room("B", capacity=2)
+        session.add_agent("Sabri", {"A": 1800, "B": 1200})
+        session.add_agent("Kye", {"A": 1500, "B": 1500})
+        moved = session.remove_agent("Sabri")
+        assignments, prices = session.get_assignments(), session.get_prices()
+    """
+
+    def __init__(self, total_rent=1.0):
+        """
+        Starts an empty building.
+        args:
+            total_rent      (float)     the rent the prices sum to
+        """
+        self.total_rent = total_rent
+
+        # agents and rooms are rows and columns of valuations, and rows of
+        # agents who left are reused
+        self.agent_rows = {}
+        self.room_columns = {}
+        self.free_rows = []
+        self.valuations = np.zeros((0, 0))
+        self.agent_slots = np.zeros(0, dtype=int)
+        self.agent_potentials = np.zeros(0)
+
+        # every room has one slot per agent it holds
+        self.slot_rooms = np.zeros(0, dtype=int)
+        self.slot_active = np.zeros(0, dtype=bool)
+        self.slot_agents = np.zeros(0, dtype=int)
+        self.slot_potentials = np.zeros(0)
+        self.old_rooms = {}
+
+    def add_room(self, room, valuations=None, capacity=1):
+        """
+        Adds a room. Agents who prefer it at price zero over their own room
+        move into it, and the agents who prefer their rooms in turn.
+        args:
+            room            (hashable)  name of the room
+            valuations      (dict)      agent name to valuation of the room, for
+                            every agent in the building
+            capacity        (int)       number of agents the room holds
+        returns:
+            moved           (list)      names of the agents whose room changed
+        """
+        valuations = {} if valuations is None else valuations
+        assert(room not in self.room_columns)
+        assert(set(valuations) == set(self.agent_rows))
+        self.start_event()
+
+        column = self.valuations.shape[1]
+        self.room_columns[room] = column
+        self.valuations = np.concatenate([self.valuations,
+                                          np.zeros((len(self.valuations), 1))], axis=1)
+        for agent, valuation in valuations.items():
+            self.valuations[self.agent_rows[agent], column] = valuation
+
+        slots = len(self.slot_rooms) + np.arange(capacity)
+        self.slot_rooms = np.append(self.slot_rooms, np.full(capacity, column))
+        self.slot_active = np.append(self.slot_active, np.ones(capacity, dtype=bool))
+        self.slot_agents = np.append(self.slot_agents, np.full(capacity, -1))
+        # the new slots are priced so that no agent envies them, and then
+        # vacated like any other free slot
+        assigned = np.flatnonzero(self.agent_slots >= 0)
+        potential = np.min(-self.valuations[assigned, column] -
+                           self.agent_potentials[assigned], initial=0)
+        self.slot_potentials = np.append(self.slot_potentials, np.full(capacity, potential))
+        for slot in slots:
+            self.vacate(slot)
+        return self.end_event()
+
+    def remove_room(self, room):
+        """
+        Removes a room and rehouses its agents.
+        returns:
+            moved           (list)      names of the agents whose room changed
+        """
+        self.start_event()
+        column = self.room_columns.pop(room)
+        slots = np.flatnonzero(self.slot_active & (self.slot_rooms == column))
+        self.slot_active[slots] = False
+        evicted = [self.unassign(slot) for slot in slots if self.slot_agents[slot] >= 0]
+        self.reassign(evicted)
+        return self.end_event()
+
+    def add_agent(self, agent, valuations):
+        """
+        Adds an agent, who is placed by one augmenting path.
+        args:
+            agent           (hashable)  name of the agent
+            valuations      (dict)      room name to valuation, for every room
+        returns:
+            moved           (list)      names of the agents whose room changed
+        """
+        assert(agent not in self.agent_rows)
+        assert(set(valuations) == set(self.room_columns))
+        self.start_event()
+
+        if self.free_rows:
+            row = self.free_rows.pop()
+        else:
+            row = len(self.valuations)
+            self.valuations = np.concatenate([self.valuations,
+                                              np.zeros((1, self.valuations.shape[1]))])
+            self.agent_slots = np.append(self.agent_slots, -1)
+            self.agent_potentials = np.append(self.agent_potentials, 0.0)
+        self.agent_rows[agent] = row
+        self.set_valuations(row, valuations)
+        self.reassign([row])
+        return self.end_event()
+
+    def remove_agent(self, agent):
+        """
+        Removes an agent. Agents who prefer the freed place move into it.
+        returns:
+            moved           (list)      names of the agents whose room changed
+        """
+        self.start_event()
+        row = self.agent_rows.pop(agent)
+        slot = self.agent_slots[row]
+        self.unassign(slot)
+        self.old_rooms.pop(row)
+        self.free_rows.append(row)
+        self.vacate(slot)
+        return self.end_event()
+
+    def update_valuations(self, agent, valuations):
+        """
+        Replaces the valuations of an agent, who leaves its place as in
+        remove_agent and is placed again as in add_agent.
+        args:
+            agent           (hashable)  name of the agent
+            valuations      (dict)      room name to valuation, for every room
+        returns:
+            moved           (list)      names of the agents whose room changed
+        """
+        assert(set(valuations) == set(self.room_columns))
+        self.start_event()
+        row = self.agent_rows[agent]
+        slot = self.agent_slots[row]
+        self.unassign(slot)
+        self.vacate(slot)
+        self.set_valuations(row, valuations)
+        self.reassign([row])
+        return self.end_event()
+
+    def set_valuations(self, row, valuations):
+        """
+        Writes the valuations of the agent in row.
+        """
+        for room, valuation in valuations.items():
+            self.valuations[row, self.room_columns[room]] = valuation
+
+    def get_costs(self, row):
+        """
+        Returns the costs of every slot for the agent in row, infinite for the
+        slots of removed rooms.
+        """
+        return np.where(self.slot_active, -self.valuations[row, self.slot_rooms], np.inf)
+
+    def start_event(self):
+        """
+        Starts recording the rooms agents leave.
+        """
+        self.old_rooms = {}
+
+    def end_event(self):
+        """
+        Returns the names of the agents whose room changed since start_event.
+        """
+        rooms = {column: room for room, column in self.room_columns.items()}
+        agents = {row: agent for agent, row in self.agent_rows.items()}
+        moved = [agents[row] for row, old_room in self.old_rooms.items()
+                 if self.slot_rooms[self.agent_slots[row]] != old_room]
+        self.old_rooms = {}
+        return moved
+
+    def unassign(self, slot):
+        """
+        Takes the agent out of slot, recording the room it leaves.
+        returns:
+            row             (int)       the row of the agent
+        """
+        row = self.slot_agents[slot]
+        self.old_rooms.setdefault(row, self.slot_rooms[slot])
+        self.slot_agents[slot] = -1
+        self.agent_slots[row] = -1
+        return row
+
+    def vacate(self, slot):
+        """
+        Restores v = 0 on a free slot. Raising the slot's potential lowers its
+        price until either the price reaches zero or an agent becomes indifferent
+        to moving in, whose own slot is then freed in turn. This is the reverse
+        of augment: a Dijkstra search from the slot over the assigned agents
+        finds the cheapest alternating path, and only the agents on it move.
+        args:
+            slot            (int)       the free slot
+        """
+        assigned = self.agent_slots >= 0
+        if not np.any(assigned):
+            self.slot_potentials[slot] = 0
+            return
+        agent_distances = np.full(len(self.agent_slots), np.inf)
+        parents = np.full(len(self.agent_slots), -1)
+        expanded = np.zeros(len(self.agent_slots), dtype=bool)
+        slot_distances = {slot: 0.0}
+        end, total = slot, -self.slot_potentials[slot]
+
+        curr_slot = slot
+        while True:
+            # agents reach the slot through their reduced cost for it
+            reduced = (-self.valuations[:, self.slot_rooms[curr_slot]] -
+                       self.agent_potentials - self.slot_potentials[curr_slot])
+            candidates = slot_distances[curr_slot] + reduced
+            closer = assigned & ~expanded & (candidates < agent_distances)
+            agent_distances[closer] = candidates[closer]
+            parents[closer] = curr_slot
+
+            row = np.argmin(np.where(expanded | ~assigned, np.inf, agent_distances))
+            if expanded[row] or not assigned[row] or agent_distances[row] >= total:
+                break
+            expanded[row] = True
+            curr_slot = self.agent_slots[row]
+            slot_distances[curr_slot] = agent_distances[row]
+            if agent_distances[row] - self.slot_potentials[curr_slot] < total:
+                end, total = curr_slot, agent_distances[row] - self.slot_potentials[curr_slot]
+
+        reached = np.array(list(slot_distances.keys()), dtype=int)
+        self.slot_potentials[reached] += total - np.array(list(slot_distances.values()))
+        self.agent_potentials[expanded] -= total - agent_distances[expanded]
+
+        # every agent on the path moves one slot towards the vacated one, which
+        # leaves the end of the path free
+        path = []
+        curr_slot = end
+        while curr_slot != slot:
+            row = self.slot_agents[curr_slot]
+            path.append((row, parents[row]))
+            curr_slot = parents[row]
+        for row, parent in path:
+            self.old_rooms.setdefault(row, self.slot_rooms[self.agent_slots[row]])
+            self.slot_agents[parent] = row
+            self.agent_slots[row] = parent
+        self.slot_agents[end] = -1 if path else self.slot_agents[end]
+
+    def reassign(self, rows):
+        """
+        Places each agent in rows by a shortest augmenting path.
+        """
+        for row in rows:
+            self.augment(row)
+
+    def augment(self, row):
+        """
+        Places the unassigned agent in row by the shortest augmenting path in the
+        reduced costs, grown by Dijkstra's algorithm from the agent until it
+        reaches a free slot. Only the potentials of the slots it visits and
+        their agents change.
+        args:
+            row             (int)       the row of the agent
+        """
+        costs = self.get_costs(row)
+        self.agent_potentials[row] = np.min(costs - self.slot_potentials)
+        distances = costs - self.agent_potentials[row] - self.slot_potentials
+        from_agents = np.full(len(distances), row)
+        visited = np.zeros(len(distances), dtype=bool)
+        while True:
+            slot = np.argmin(np.where(visited, np.inf, distances))
+            if not np.isfinite(distances[slot]) or visited[slot]:
+                raise SolverError("no room has space for another agent")
+            if self.slot_agents[slot] < 0:
+                break
+            visited[slot] = True
+            other = self.slot_agents[slot]
+            reduced = (self.get_costs(other) - self.agent_potentials[other] -
+                       self.slot_potentials)
+            closer = ~visited & (distances[slot] + reduced < distances)
+            distances[closer] = distances[slot] + reduced[closer]
+            from_agents[closer] = other
+
+        total = distances[slot]
+        shifts = total - distances[visited]
+        self.slot_potentials[visited] -= shifts
+        self.agent_potentials[self.slot_agents[visited]] += shifts
+        self.agent_potentials[row] += total
+
+        # every agent on the path moves one slot towards the free one
+        while True:
+            agent = from_agents[slot]
+            previous_slot = self.agent_slots[agent]
+            if previous_slot >= 0:
+                self.unassign(previous_slot)
+            else:
+                self.old_rooms.setdefault(agent, -1)
+            self.slot_agents[slot] = agent
+            self.agent_slots[agent] = slot
+            if agent == row:
+                break
+            slot = previous_slot
+
+    def get_assignments(self):
+        """
+        Returns the room of every agent.
+        returns:
+            assignments     (dict)      agent name to room name
+        """
+        rooms = {column: room for room, column in self.room_columns.items()}
+        return {agent: rooms[self.slot_rooms[self.agent_slots[row]]]
+                for agent, row in self.agent_rows.items()}
+
+    def get_prices(self):
+        """
+        Returns envy-free prices of every room, which sum to the rent over the
+        agents. All slots of a room have the same potential, so a room's price
+        is the negated potential of any of its slots.
+        returns:
+            prices          (dict)      room name to price, in units of rent
+        """
+        columns = np.array(list(self.room_columns.values()), dtype=int)
+        prices = np.zeros(self.valuations.shape[1])
+        prices[self.slot_rooms] = -self.slot_potentials
+        if self.agent_rows:
+            rows = np.array(list(self.agent_rows.values()), dtype=int)
+            occupied = self.slot_rooms[self.agent_slots[rows]]
+            prices += (self.total_rent - np.sum(prices[occupied])) / len(rows)
+        return {room: float(prices[column])
+                for room, column in zip(self.room_columns, columns)}
+
+    def get_method_prices(self, method_class=MaxMinUtilityMethod):
+        """
+        Prices the current assignment with a method, which solves its program
+        over the whole building, so unlike get_prices this costs a full solve.
+        args:
+            method_class    (class)     a class of Method type
+        returns:
+            prices          (dict)      room name to price, in units of rent
+        """
+        rows = np.array(list(self.agent_rows.values()), dtype=int)
+        columns = np.array(list(self.room_columns.values()), dtype=int)
+        capacities = np.bincount(self.slot_rooms[self.slot_active],
+                                 minlength=self.valuations.shape[1])[columns]
+        method = method_class(self.valuations[np.ix_(rows, columns)] / self.total_rent,
+                              verbosity=0, capacities=capacities)
+        room_ids = np.zeros(self.valuations.shape[1], dtype=int)
+        room_ids[columns] = np.arange(len(columns))
+        method.assignments = room_ids[self.slot_rooms[self.agent_slots[rows]]]
+        prices = method.solve_prices() * self.total_rent
+        return dict(zip(self.room_columns, prices.tolist()))
+
+    def get_welfare(self):
+        """
+        Returns the total valuation of the agents for their rooms.
+        """
+        rows = np.array(list(self.agent_rows.values()), dtype=int)
+        if len(rows) == 0:
+            return 0.0
+        return float(np.sum(self.valuations[rows, self.slot_rooms[self.agent_slots[rows]]]))
@@ -0,0 +1,137 @@
+"""
+Implements a small dense two-phase simplex method in pure numpy, for the pricing
+programs of the methods when no LP solver is installed. The programs have one
+variable per room and one row per envy-freeness constraint, so a dense tableau
+is cheap at the sizes of a household.
+"""
+
+import numpy as np
+
+from methods.solver import SolverError
+
+
+def simplex(c, G, h, A=None, b=None, tolerance=1e-9, max_iterations=100000):
+    """
+    Solves the linear program
+        minimize    c'x
+        subject to  Gx <= h
+                    Ax = b
+    over free x. The program is brought into standard form by splitting x into
+    nonnegative parts and adding a slack to every row of G, and solved with
+    Dantzig's pivoting rule, falling back to Bland's rule after degenerate
+    pivots so that it cannot cycle. The dual variables follow the convention of
+    cvxopt, c + G'z + A'y = 0 with z >= 0.
+    args:
+        c, G, h, A, b   (ndarray)   the program
+        tolerance       (float)     entries smaller than this count as zero
+        max_iterations  (int)       the maximum number of pivots per phase
+    returns:
+        x               (ndarray)   1D array, the primal solution
+        z               (ndarray)   1D array, the dual variables of Gx <= h
+        y               (ndarray)   1D array, the dual variables of Ax = b
+    """
+    c = np.asarray(c, dtype=float).reshape(-1)
+    G = np.asarray(G, dtype=float).reshape(-1, len(c))
+    h = np.asarray(h, dtype=float).reshape(-1)
+    if A is None:
+        A, b = np.zeros((0, len(c))), np.zeros(0)
+    A = np.asarray(A, dtype=float).reshape(-1, len(c))
+    b = np.asarray(b, dtype=float).reshape(-1)
+    num_vars = len(c)
+    num_ineq = len(h)
+
+    # standard form over [x+, x-, slacks] >= 0
+    matrix = np.block([[G, -G, np.eye(num_ineq)],
+                       [A, -A, np.zeros((len(b), num_ineq))]])
+    rhs = np.concatenate([h, b])
+    costs = np.concatenate([c, -c, np.zeros(num_ineq)])
+    signs = np.where(rhs < 0, -1.0, 1.0)
+    matrix *= signs[:, np.newaxis]
+    rhs *= signs
+
+    # slacks of rows that were not flipped start in the basis, the other rows
+    # get an artificial variable
+    num_rows, num_cols = matrix.shape
+    basis = np.full(num_rows, -1)
+    slack_rows = np.flatnonzero(signs[:num_ineq] > 0)
+    basis[slack_rows] = 2 * num_vars + slack_rows
+    artificial_rows = np.flatnonzero(basis < 0)
+    artificials = np.zeros((num_rows, len(artificial_rows)))
+    artificials[artificial_rows, np.arange(len(artificial_rows))] = 1
+    basis[artificial_rows] = num_cols + np.arange(len(artificial_rows))
+    tableau = np.concatenate([matrix, artificials, rhs[:, np.newaxis]], axis=1)
+
+    # phase 1 minimizes the sum of the artificial variables
+    phase_costs = np.zeros(tableau.shape[1] - 1)
+    phase_costs[num_cols:] = 1
+    run_phase(tableau, basis, phase_costs, tolerance, max_iterations)
+    if np.dot(phase_costs[basis], tableau[:, -1]) > tolerance * max(1, np.max(np.abs(rhs))):
+        raise SolverError("simplex found the program infeasible")
+
+    # artificial variables left in the basis are pivoted out, and rows where
+    # that is impossible are redundant
+    rows = np.arange(num_rows)
+    for row in np.flatnonzero(basis >= num_cols):
+        candidates = np.flatnonzero(np.abs(tableau[row, :num_cols]) > tolerance)
+        if len(candidates) > 0:
+            pivot(tableau, basis, row, candidates[0])
+    kept = basis < num_cols
+    tableau = np.concatenate([tableau[kept, :num_cols], tableau[kept, -1:]], axis=1)
+    basis = basis[kept]
+    rows = rows[kept]
+
+    run_phase(tableau, basis, costs, tolerance, max_iterations)
+
+    # the solution and duals are recomputed from the basis for accuracy
+    basis_matrix = matrix[rows][:, basis]
+    solution = np.zeros(num_cols)
+    solution[basis] = np.linalg.solve(basis_matrix, rhs[rows])
+    duals = np.zeros(num_rows)
+    duals[rows] = np.linalg.solve(basis_matrix.T, costs[basis])
+    duals *= signs
+
+    x = solution[:num_vars] - solution[num_vars:2 * num_vars]
+    return x, -duals[:num_ineq], -duals[num_ineq:]
+
+
+def run_phase(tableau, basis, costs, tolerance=1e-9, max_iterations=100000):
+    """
+    Pivots the tableau in place until no variable has a negative reduced cost.
+    args:
+        tableau         (ndarray)   2D matrix of the constraints, the right hand
+                        side in the last column, in canonical form for basis
+        basis           (ndarray)   1D array of the basic variable of each row
+        costs           (ndarray)   1D array of the cost of each variable
+    """
+    degenerate = False
+    for _ in range(max_iterations):
+        reduced = costs - np.dot(costs[basis], tableau[:, :-1])
+        entering_candidates = np.flatnonzero(reduced < -tolerance)
+        if len(entering_candidates) == 0:
+            return
+        if degenerate:
+            entering = entering_candidates[0]
+        else:
+            entering = entering_candidates[np.argmin(reduced[entering_candidates])]
+
+        column = tableau[:, entering]
+        rows = np.flatnonzero(column > tolerance)
+        if len(rows) == 0:
+            raise SolverError("simplex found the program unbounded")
+        ratios = tableau[rows, -1] / column[rows]
+        best = rows[ratios <= np.min(ratios) + tolerance]
+        row = best[np.argmin(basis[best])]
+        degenerate = tableau[row, -1] <= tolerance
+        pivot(tableau, basis, row, entering)
+    raise SolverError("simplex exceeded the maximum number of iterations")
+
+
+def pivot(tableau, basis, row, column):
+    """
+    Makes column basic in row, in place.
+    """
+    tableau[row] /= tableau[row, column]
+    factors = tableau[:, column].copy()
+    factors[row] = 0
+    tableau -= np.outer(factors, tableau[row])
+    basis[row] = column
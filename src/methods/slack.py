@@ -0,0 +1,70 @@
+"""
+Implements pricing that keeps splits envy-free under valuation noise.
+"""
+
+import numpy as np
+
+from methods.lp_method import LPMethod
+
+
+class MaxMinSlackMethod(LPMethod):
+    """
+    Implementation of the margin-maximizing splitting algorithm. Prices maximize
+    the minimum envy slack, i.e. how much less any agent likes another room than
+    its own at the prices, so that the split stays envy-free for the largest
+    errors in the reported valuations.
+    Example usage:
+        valuations = get_valuations()
+        method = MaxMinSlackMethod(valuations)
+        assignments, prices = method.solve()
+        radius = method.get_noise_radius()
+    """
+
+    def __init__(self, valuations, verbosity=1, **kwargs):
+        """
+        Intializes the method.
+        args:
+            valuations      (ndarray)   2D matrix of shape (n, m) where position (i, j)
+                            gives the valuation of agent i for room j.
+            verbosity       (int)       0=no output, 1=step output, 2=solver output
+            kwargs          (dict)      options passed to LPMethod, e.g. capacities
+        """
+        super().__init__(valuations, verbosity, **kwargs)
+
+    def solve_prices(self):
+        """
+        Assigns prices to the already assigned rooms by maximizing the minimum
+        envy slack over all agents and other rooms:
+            maximize    t
+            subject to  p[assigned_room] - p[other_room] + t <=
+                            v[agent, assigned_room] - v[agent, other_room]
+                        prices sum to 1
+        A nonnegative optimum means the split is envy-free.
+        returns:
+            self.prices         (ndarray)   1D array of prices. self.price[i]
+                                is the price for room i.
+        """
+        # objective function, minimum slack is stored at last index [-1]
+        c = np.zeros((self.m + 1, 1))
+        c[-1, 0] = -1
+
+        # ensure the minimum is actually the minimum slack of each envy constraint
+        G, h = self.build_envy_constraints()
+        G[:, -1] = 1
+
+        # the slack is unbounded when no two rooms are occupied, so it is capped
+        # at the total rent
+        cap = np.zeros((1, self.m + 1))
+        cap[0, -1] = 1
+        G = np.concatenate([G, cap], axis=0)
+        h = np.concatenate([h, np.ones(1)], axis=0)
+
+        # ensure prices sum to 1
+        A, b = self.build_rent_constraint()
+
+        # solve program
+        status, x, z, y = self.context.lp(c, G, h, A, b)
+        self.prices = x[:self.m]
+        self.slack = x[-1]
+
+        return self.prices
@@ -0,0 +1,296 @@
+"""
+Implements a long-lived solver context that holds GLPK options and scratch
+buffers, so that servers and simulations pay the solver setup costs once. 
+cvxopt is imported on first use, since the import is slow and the other 
+backends in methods.backends do without it.
+"""
+
+import threading
+
+import numpy as np
+
+
+class SolverError(Exception):
+    """
+    Raised when a program could not be solved to optimality, e.g. because the
+    envy-freeness constraints are infeasible.
+    """
+    pass
+
+
+class SolverContext():
+    """
+    Solves linear and binary linear programs with GLPK. Options are passed to
+    GLPK on every call rather than written to the global `cvxopt.solvers.options`
+    and `cvxopt.glpk.options`, and the cvxopt matrices handed to GLPK are reused
+    across solves of the same shape. Buffers are kept per thread and calls into
+    GLPK are serialized, so one context can be shared by many threads.
+    Example usage:
+        context = SolverContext()
+        for valuations in batch:
+            method = MaxMinUtilityMethod(valuations, context=context)
+            assignments, prices = method.solve()
+    """
+
+    defaults = {}
+    defaults_lock = threading.Lock()
+
+    def __init__(self, verbosity=1):
+        """
+        Initializes the context.
+        args:
+            verbosity       (int)       0=no output, 1=step output, 2=solver output
+        """
+        self.verbosity = verbosity
+        self.options = {"msg_lev": "GLP_MSG_ALL" if verbosity >= 2 else "GLP_MSG_OFF"}
+
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    @classmethod
+    def get_default(cls, verbosity=1):
+        """
+        Returns the context shared by all methods created without one.
+        args:
+            verbosity       (int)       0=no output, 1=step output, 2=solver output
+        """
+        solver_output = verbosity >= 2
+        # the defaults are shared with subclasses, so they are kept per class
+        key = (cls, solver_output)
+        with cls.defaults_lock:
+            if key not in cls.defaults:
+                cls.defaults[key] = cls(verbosity)
+            return cls.defaults[key]
+
+    def get_buffer(self, name, array):
+        """
+        Copies array into this thread's cvxopt buffer called name, allocating
+        the buffer only when no buffer of the same shape exists.
+        args:
+            name            (str)       name of the buffer, e.g. "G"
+            array           (ndarray)   the array to copy, 1D or 2D
+        returns:
+            buffer          (matrix)    dense 'd' cvxopt matrix holding array
+        """
+        from cvxopt import matrix
+
+        array = np.asarray(array, dtype=float)
+        if array.ndim == 1:
+            array = array.reshape(-1, 1)
+
+        if not hasattr(self.local, "buffers"):
+            self.local.buffers = {}
+        buffer = self.local.buffers.get(name)
+        if buffer is None or buffer.size != array.shape:
+            buffer = matrix(0.0, array.shape)
+            self.local.buffers[name] = buffer
+
+        # cvxopt matrices expose their column-major storage as a writable view
+        np.asarray(buffer)[...] = array
+        return buffer
+
+    def lp(self, c, G, h, A, b):
+        """
+        Solves the linear program
+            minimize    c'x
+            subject to  Gx <= h
+                        Ax = b
+        args:
+            c, G, h, A, b   (ndarray)   the program, G and A may also be cvxopt
+                            sparse matrices
+        returns:
+            status          (str)       'optimal'
+            x               (ndarray)   1D array, the primal solution
+            z               (ndarray)   1D array, the dual variables of Gx <= h
+            y               (ndarray)   1D array, the dual variables of Ax = b
+        """
+        from cvxopt import glpk
+
+        args = self.get_program(c, G, h, A, b)
+        with self.lock:
+            status, x, z, y = glpk.lp(*args, options=self.options)
+        if status != "optimal":
+            raise SolverError(f"lp returned status '{status}'")
+        return status, self.to_array(x), self.to_array(z), self.to_array(y)
+
+    def ilp(self, c, G, h, A, b, B):
+        """
+        Solves the binary linear program
+            minimize    c'x
+            subject to  Gx <= h
+                        Ax = b
+                        x[k] is binary for k in B
+        args:
+            c, G, h, A, b   (ndarray)   the program, G and A may also be cvxopt
+                            sparse matrices
+            B               (set)       indices of binary variables
+        returns:
+            status          (str)       'optimal'
+            x               (ndarray)   1D array, the solution
+        """
+        from cvxopt import glpk
+
+        args = self.get_program(c, G, h, A, b)
+        with self.lock:
+            status, x = glpk.ilp(*args, B=B, options=self.options)
+        if status != "optimal":
+            raise SolverError(f"ilp returned status '{status}'")
+        return status, self.to_array(x)
+
+    def get_program(self, c, G, h, A, b):
+        """
+        Converts a program to cvxopt matrices, reusing buffers where possible.
+        """
+        from cvxopt import spmatrix
+
+        return (self.get_buffer("c", c),
+                G if isinstance(G, spmatrix) else self.get_buffer("G", G),
+                self.get_buffer("h", h),
+                A if isinstance(A, spmatrix) else self.get_buffer("A", A),
+                self.get_buffer("b", b))
+
+    def assign(self, weights, capacities, bound=None):
+        """
+        Assigns each agent one room, within the capacities, maximizing the total
+        weight, by solving the binary program of build_assignment_program.
+        args:
+            weights         (ndarray)   2D matrix of shape (n, m) of the weight of
+                            each (agent, room) pair
+            capacities      (ndarray)   1D array of shape (m,)
+            bound           (tuple)     see build_assignment_program
+        returns:
+            assignments     (ndarray)   1D array of shape (n,) of rooms
+        """
+        from cvxopt import spmatrix
+
+        c, G, h, A, b = build_assignment_program(weights, capacities, bound)
+        shape = (len(h), weights.size)
+        G = spmatrix(G[0].tolist(), G[1].tolist(), G[2].tolist(), shape)
+        A = spmatrix(A[0].tolist(), A[1].tolist(), A[2].tolist(), (len(b), weights.size))
+        status, x = self.ilp(c, G, h, A, b, set(range(weights.size)))
+        return np.argmax(x.reshape(weights.shape), axis=1)
+
+    def to_array(self, x):
+        """
+        Converts a cvxopt solution vector to a 1D ndarray.
+        """
+        return np.array(x).reshape(-1)
+
+
+class WarmStartContext():
+    """
+    Wraps a solver context to warm-start programs that are solved again with 
+    only their right-hand sides changed, e.g. the pricing program of a fixed 
+    assignment under new valuations. The objective and constraint matrices are
+    then the same, so the previous optimal duals stay dual feasible, and if the
+    constraints that were tight at the previous optimum still meet at a 
+    feasible point, that point is optimal with the same duals. It is found by
+    one linear solve instead of a program, and the wrapped context solves the
+    program only when it is not. Everything else is left to the wrapped context.
+    Example usage:
+        context = WarmStartContext(SolverContext.get_default(0))
+        for valuations in chain:
+            method = MaxMinUtilityMethod(valuations, context=context)
+            method.assignments = assignments
+            prices = method.solve_prices()
+    """
+
+    def __init__(self, context, tolerance=1e-9, max_bases=4):
+        """
+        Initializes the context.
+        args:
+            context         (SolverContext) the context solving the programs
+            tolerance       (float)     violation, relative to the right-hand 
+                            side, that counts as tight or feasible
+            max_bases       (int)       the number of programs remembered
+        """
+        self.context = context
+        self.tolerance = tolerance
+        self.max_bases = max_bases
+        self.bases = []
+        self.num_warm = 0
+
+    def __getattr__(self, name):
+        return getattr(self.context, name)
+
+    def lp(self, c, G, h, A, b):
+        """
+        Solves the linear program of SolverContext.lp, from a remembered basis
+        of the same program if possible.
+        """
+        c, G, h, A, b = [np.asarray(array, dtype=float) for array in (c, G, h, A, b)]
+        h, b = h.reshape(-1), b.reshape(-1)
+        # bases are (c, G, A, tight rows, z, y), the most recently used first
+        for index, base in enumerate(self.bases):
+            if all(np.array_equal(old, new) for old, new in zip(base[:3], (c, G, A))):
+                self.bases.pop(index)
+                x = self.solve_basis(G, h, A, b, base[3])
+                if x is not None:
+                    self.bases.insert(0, base)
+                    self.num_warm += 1
+                    return "optimal", x, base[4], base[5]
+                break
+
+        status, x, z, y = self.context.lp(c, G, h, A, b)
+        tight = np.abs(np.dot(G, x) - h) <= self.tolerance * np.maximum(np.abs(h), 1)
+        self.bases = [(c, G, A, tight, z, y)] + self.bases[:self.max_bases - 1]
+        return status, x, z, y
+
+    def solve_basis(self, G, h, A, b, tight):
+        """
+        Finds the point where the tight constraints meet, if it is unique and
+        feasible.
+        returns:
+            x               (ndarray)   1D array, None if there is no such point
+        """
+        matrix = np.concatenate([G[tight], A.reshape(-1, G.shape[1])], axis=0)
+        rhs = np.concatenate([h[tight], b])
+        x, _, rank, _ = np.linalg.lstsq(matrix, rhs, rcond=None)
+        if rank < G.shape[1]:
+            return None
+        scale = np.maximum(np.abs(rhs), 1)
+        if np.any(np.abs(np.dot(matrix, x) - rhs) > self.tolerance * scale):
+            return None
+        if np.any(np.dot(G, x) - h > self.tolerance * np.maximum(np.abs(h), 1)):
+            return None
+        return x
+
+
+def build_assignment_program(weights, capacities, bound=None):
+    """
+    Builds the binary program of the assignment maximizing the total weight, 
+    over x of shape (n, m) flattened:
+        minimize    -weights'x
+        subject to  sum_i x[i, j] <= capacities[j]  for every room j
+                    bound_weights'x >= minimum      if bound is given
+                    sum_j x[i, j] = 1               for every agent i
+    G and A are given by the values, rows and columns of their nonzero entries,
+    for each backend to build its own sparse matrices from.
+    args:
+        weights         (ndarray)   2D matrix of shape (n, m)
+        capacities      (ndarray)   1D array of shape (m,)
+        bound           (tuple)     bound_weights, a 2D matrix of shape (n, m), 
+                        and minimum, a float
+    returns:
+        c               (ndarray)   1D array of shape (n * m,)
+        G               (tuple)     values, rows and columns of G's entries
+        h               (ndarray)   1D array of shape (m,), or (m + 1,) with bound
+        A               (tuple)     values, rows and columns of A's entries
+        b               (ndarray)   1D array of shape (n,)
+    """
+    n, m = weights.shape
+    agents, rooms = np.divmod(np.arange(n * m), m)
+    columns = np.arange(n * m)
+
+    c = -1 * np.asarray(weights, dtype=float).flatten()
+    G = (np.ones(n * m), rooms, columns)
+    h = np.asarray(capacities, dtype=float)
+    if bound is not None:
+        bound_weights, minimum = bound
+        G = (np.concatenate([G[0], -np.asarray(bound_weights, dtype=float).flatten()]),
+             np.concatenate([rooms, np.full(n * m, m)]),
+             np.concatenate([columns, columns]))
+        h = np.append(h, -minimum)
+    A = (np.ones(n * m), agents, columns)
+    b = np.ones(n)
+    return c, G, h, A, b
@@ -3,9 +3,6 @@ Implements same algorithm described in http://procaccia.info/papers/rent.pdf.
 """
 
 import numpy as np
-import cvxopt
-from cvxopt import matrix
-from cvxopt.solvers import lp
 
 from methods.lp_method import LPMethod
 
@@ -19,15 +16,27 @@ class MaxMinUtilityMethod(LPMethod):
         self.assignemnts, self.prices = method.solve()
     """
 
-    def __init__(self, valuations, verbosity=1):
+    def __init__(self, valuations, verbosity=1, top_k=None, tolerance=1e-9, 
+                 leximin=False, **kwargs):
         """
         Intializes the method. 
         args:
-            valuations      (ndarray)   2D matrix of shape (n, n) where position (i, j)
+            valuations      (ndarray)   2D matrix of shape (n, m) where position (i, j)
                             gives the valuation of agent i for room j. 
             verbosity       (int)       0=no output, 1=step output, 2=solver output
+            top_k           (int)       if set, prices are solved by constraint 
+                            generation, starting from the envy-freeness constraints
+                            of each agent's top_k rooms. 
+            tolerance       (float)     envy tolerated before a constraint is added
+                            during constraint generation
+            leximin         (bool)      if set, prices are refined to leximin prices,
+                            with all envy-freeness constraints
+            kwargs          (dict)      options passed to LPMethod, e.g. capacities
         """
-        super().__init__(valuations, verbosity)
+        super().__init__(valuations, verbosity, **kwargs)
+        self.top_k = top_k
+        self.tolerance = tolerance
+        self.leximin = leximin
         
     def solve_prices(self):
         """
@@ -39,9 +48,21 @@ class MaxMinUtilityMethod(LPMethod):
                                 is the price for room i. 
         """
         # objective function, minimum is stored at last index [-1]
-        c = np.zeros((self.n + 1, 1))
+        c = np.zeros((self.m + 1, 1))
         c[-1, 0] = -1
 
+        # the minimum utility bounds each room's price by its occupants' valuations
+        offsets = np.full(self.m, np.inf)
+        np.minimum.at(offsets, self.assignments, 
+                      self.valuations[np.arange(self.n), self.assignments])
+
+        # the optimum without envy-freeness constraints solves the program 
+        # when it is envy-free
+        prices = self.solve_relaxed_prices(offsets)
+        if prices is not None:
+            self.prices = prices
+            return self.prices
+
         # inqueality constraints
         all_G = []
         all_h = []
@@ -50,7 +71,7 @@ class MaxMinUtilityMethod(LPMethod):
         for agent_id in range(self.n):
             assigned_room = self.assignments[agent_id]
 
-            g = np.zeros(self.n + 1)
+            g = np.zeros(self.m + 1)
             g[-1] = 1
             g[assigned_room] = 1 
             h = self.valuations[agent_id, assigned_room] 
@@ -58,33 +79,115 @@ class MaxMinUtilityMethod(LPMethod):
             all_G.append(g)
             all_h.append(h)
         
-        # ensure envy-freeness 
-        for agent_id in range(self.n):
-            assigned_room = self.assignments[agent_id]
-            for other_room in range(self.n):
-                if other_room == assigned_room:
-                    continue
-                g = np.zeros(self.n + 1)
-                g[assigned_room] = 1.0
-                g[other_room] = -1.0
-
-                h = (self.valuations[agent_id, assigned_room] - 
-                     self.valuations[agent_id, other_room])
-                
-                all_G.append(g)
-                all_h.append(h)
-        G = np.stack(all_G, axis=0)
-        h = np.stack(all_h, axis=0)
+        min_G = np.stack(all_G, axis=0)
+        min_h = np.stack(all_h, axis=0)
 
         # ensure prices sum to 1
-        A = np.ones((1, self.n + 1))
-        A[0, -1] = 0 
-        b = np.ones((1, 1))
+        A, b = self.build_rent_constraint()
+
+        if self.leximin:
+            return self.solve_leximin_prices(c, min_G, min_h, A, b)
+
+        # ensure envy-freeness, either in full or by adding violated constraints
+        # to a small initial subset until none remain
+        mask = None if self.top_k is None else self.get_initial_mask()
+        while True:
+            envy_G, envy_h = self.build_envy_constraints(mask=mask)
+            G = np.concatenate([min_G, envy_G], axis=0)
+            h = np.concatenate([min_h, envy_h], axis=0)
+
+            # solve program
+            status, x, z, y = self.context.lp(c, G, h, A, b)
+            self.prices = x[:self.m]
+            if mask is None:
+                break
 
-        # solve program
-        solution = lp(matrix(c, tc='d'), matrix(G, tc='d'), 
-                      matrix(h, tc='d'), matrix(A, tc='d'), 
-                      matrix(b, tc='d'), solver='glpk')
-        self.prices = np.array(solution['x']).squeeze()[:self.n]
+            violated = (self.get_envy(self.prices) > self.tolerance) & ~mask
+            if not np.any(violated):
+                break
+            mask |= violated
+            self.log(f"Adding {np.sum(violated)} envy constraints...", level=2)
 
-        return self.prices
\ No newline at end of file
+        return self.prices
+
+    def solve_leximin_prices(self, c, min_G, min_h, A, b):
+        """
+        Refines the max-min prices to leximin prices: maximizes the minimum utility, 
+        then the minimum utility of the agents not held at it, and so on. Each 
+        round fixes at once
+        1) every agent whose minimum row has a positive dual, since that row is 
+           tight in every optimum, and 
+        2) every agent whose utility the envy-freeness of the fixed agents caps at
+           the round's minimum: if agent i envies no one, agent k in room r has 
+           utility at most u[i] + v[k, r] - v[i, r], and
+        3) every agent sharing a room with a fixed agent, whose price, and so 
+           utility, is then fixed too. 
+        Since every round fixes at least one agent, and usually all agents at the 
+        same level, this takes one program per distinct utility level. The 
+        program keeps its shape across rounds, only the rows of fixed agents 
+        change. 
+        args:
+            c, min_G, min_h (ndarray)   the objective and minimum rows of the 
+                            max-min program
+            A, b            (ndarray)   the rent constraint
+        returns:
+            self.prices         (ndarray)   1D array of prices. self.price[i]
+                                is the price for room i. 
+        """
+        envy_G, envy_h = self.build_envy_constraints()
+        G = np.concatenate([min_G, envy_G], axis=0)
+        h = np.concatenate([min_h, envy_h], axis=0)
+
+        own = self.valuations[np.arange(self.n), self.assignments]
+        # caps[i, k] bounds the utility of agent k above that of agent i
+        caps = own - self.valuations[:, self.assignments]
+
+        utilities = np.zeros(self.n)
+        fixed = np.zeros(self.n, dtype=bool)
+        while True:
+            status, x, z, y = self.context.lp(c, G, h, A, b)
+            level = x[-1]
+            tight = (z[:self.n] > self.tolerance) & ~fixed
+            fixed |= tight
+            utilities[tight] = level
+
+            while not np.all(fixed):
+                bounds = np.min(caps[fixed] + utilities[fixed].reshape(-1, 1), axis=0)
+                capped = ~fixed & (bounds <= level + self.tolerance)
+                fixed |= capped
+                utilities[capped] = level
+
+                fixed_prices = np.full(self.m, np.nan)
+                fixed_prices[self.assignments[fixed]] = (own - utilities)[fixed]
+                sharing = ~fixed & ~np.isnan(fixed_prices[self.assignments])
+                fixed |= sharing
+                utilities[sharing] = (own - fixed_prices[self.assignments])[sharing]
+                if not np.any(capped | sharing):
+                    break
+
+            self.log(f"Fixed {np.sum(fixed)} of {self.n} agents at utility {level}.", 
+                     level=2)
+            if np.all(fixed):
+                break
+
+            # fixed agents keep their utility and no longer bound the minimum
+            G[:self.n][fixed, -1] = 0
+            h[:self.n][fixed] = own[fixed] - utilities[fixed]
+
+        self.prices = x[:self.m]
+        return self.prices
+
+    def get_initial_mask(self):
+        """
+        Selects the initial envy-freeness constraints for constraint generation: 
+        those of each agent for its top_k most valued rooms, and those nearly 
+        tight at the prices supporting the assignment. 
+        returns:
+            mask            (ndarray)   2D boolean matrix of shape (n, m)
+        """
+        top_rooms = np.argsort(-self.valuations, axis=1)[:, :self.top_k]
+        mask = np.zeros((self.n, self.m), dtype=bool)
+        mask[np.arange(self.n).reshape(-1, 1), top_rooms] = True
+        value_range = np.max(self.valuations) - np.min(self.valuations)
+        mask |= self.get_envy(self.get_assignment_prices()) >= -1e-6 * value_range
+        return mask
@@ -1,16 +1,22 @@
 
 """
 """
+import json
+import logging
 import os
 
 import numpy as np
-import seaborn as sns
-import matplotlib.pyplot as plt 
+from scipy.special import gammaincinv
 
+from methods.envy_graph import build_envy_graph, get_shortest_paths
 from methods.price import MaxMinPriceMethod, MinMaxPriceMethod
+from methods.solver import SolverContext, SolverError, WarmStartContext
 from methods.utility import MaxMinUtilityMethod
 from methods.demand import MinMaxDemandMethod
-from utils import Process
+from methods.slack import MaxMinSlackMethod
+from plot import plot_fractions, plot_radii
+from sweep import SweepRunner, get_envy_free
+from utils import Process, sample_dirichlet
 
 
 class NoisySimulation(Process):
@@ -27,6 +33,52 @@ class NoisySimulation(Process):
                                for i in range(self.n)], axis=0).squeeze()
         return valuations
     
+    def get_starting_valuations_batch(self, num_samples):
+        """
+        Samples num_samples starting valuations at once, distributed as 
+        get_starting_valuations, of the float dtype given by "dtype".
+        returns:
+            valuations  (ndarray)   3D array of shape (num_samples, n, n)
+        """
+        dtype = getattr(self, "dtype", "float64")
+        uniform = np.ones((num_samples, self.n)) / self.n
+        means = sample_dirichlet(uniform * self.mean_scale, 
+                                 random_state=self.random_state)
+        # every agent of a sample shares its concentrations, which are only
+        # broadcast, so no array of the size of all valuations is allocated
+        alphas = np.broadcast_to(means[:, np.newaxis, :] * self.initial_scale,
+                                 (num_samples, self.n, self.n))
+        return sample_dirichlet(alphas, dtype=dtype, random_state=self.random_state)
+
+    def perturb_valuations_batch(self, valuations, scale=10):
+        """
+        Perturbs each valuations vector along the last axis of valuations, as 
+        perturb_valuations.
+        args:
+            valuations (ndarray)   array of shape (..., n)
+            scale   (int) the scale for the dirichlet distribution
+        """
+        return sample_dirichlet(valuations * scale, dtype=valuations.dtype,
+                                random_state=self.random_state)
+
+    def perturb_valuations_common(self, valuations, uniforms, scale=10):
+        """
+        Perturbs valuations as perturb_valuations_batch, but with the gamma 
+        variables of the dirichlet distribution drawn by inverting their CDF at
+        fixed uniforms. Reusing the uniforms for every scale gives common random
+        numbers: the noise at neighbouring scales is nearly the same, so 
+        differences between scales are not drowned out by resampling.
+        args:
+            valuations (ndarray)   array of shape (..., n)
+            uniforms   (ndarray)   array of the shape of valuations, uniform on [0, 1)
+            scale   (int) the scale for the dirichlet distribution
+        """
+        gammas = gammaincinv(valuations * scale, uniforms).astype(valuations.dtype)
+        # a row of underflowed gammas would not normalize
+        gammas = np.maximum(gammas, np.finfo(gammas.dtype).tiny)
+        gammas /= np.sum(gammas, axis=-1, keepdims=True)
+        return gammas
+
     def is_envy_free(self, valuations, assignments, prices, epsilon=1e-5):
         """
         """
@@ -53,7 +105,8 @@ class NoisySimulation(Process):
         valuations = valuations.reshape(-1, self.n)
         perturbed_valuations = np.zeros_like(valuations)
         for i in range(valuations.shape[0]):
-            perturbed_valuations[i, :] = np.random.dirichlet(valuations[i, :] * scale)
+            perturbed_valuations[i, :] = self.random_state.dirichlet(valuations[i, :] *
+                                                                     scale)
         return perturbed_valuations
 
     def simulate_split(self, method_class, noise_scale):
@@ -61,16 +114,152 @@ class NoisySimulation(Process):
         """
         valuations = self.get_starting_valuations()
         noisy_valuations = self.perturb_valuations(valuations, noise_scale)
-        method = method_class(noisy_valuations, verbosity=0) 
+        method = method_class(noisy_valuations, verbosity=0, tiebreak=self.get_tiebreak())
         assignments, prices = method.solve()
         return valuations, assignments, prices
 
+    def certify(self, method_class):
+        """
+        Certifies for num_samples households the noise radius the split of 
+        method_class tolerates, with one solve per household instead of 
+        resampling the noise. 
+        args:
+            method_class    (class) a class of Method type
+        returns:
+            radii           (list)  the certified radius of each household
+        """
+        radii = []
+        for i in range(self.num_samples):
+            method = method_class(self.get_starting_valuations(), verbosity=0,
+                                  tiebreak=self.get_tiebreak())
+            method.solve()
+            radii.append(method.get_noise_radius())
+        return radii
+
     def run(self):
         """
         """
+        if getattr(self, "certify_radii", False):
+            self.radii = {}
+            for method_name in self.methods:
+                assert(method_name in globals())
+                self.radii[method_name] = self.certify(globals()[method_name])
+            self.save_results()
+            if not getattr(self, "defer_plots", False):
+                self.visualize()
+            return
+
         self.noise_scales = np.logspace(self.scale_range[0], 
                                         self.scale_range[1], 
                                         num=self.scale_samples)
+        if getattr(self, "warm_start", False):
+            self.run_chained()
+        elif getattr(self, "shared_memory", False):
+            self.run_shared()
+        else:
+            self.run_sequential()
+
+        self.save_results()
+        if not getattr(self, "defer_plots", False):
+            self.visualize()
+
+    def run_shared(self):
+        """
+        Estimates the fractions of envy-free splits over "num_workers" processes,
+        with the samples, splits and checks held in shared memory. The same 
+        starting valuations are reused for every method and noise scale. 
+        """
+        runner = SweepRunner(self, num_workers=getattr(self, "num_workers", 1),
+                             chunk_size=getattr(self, "batch_size", 1000))
+        self.fractions = {}
+        try:
+            for method_name in self.methods:
+                assert(method_name in globals())
+                method_class = globals()[method_name]
+                fractions = []
+                for noise_scale in self.noise_scales:
+                    _, envy_free = runner.run(method_class, noise_scale)
+                    fractions.append(float(np.mean(envy_free)))
+                self.fractions[method_name] = fractions
+        finally:
+            runner.close()
+
+    def run_chained(self):
+        """
+        Estimates the fractions of envy-free splits with common random numbers,
+        walking the noise scales in order. The same starting valuations and noise
+        uniforms are used at every scale, and each sample's assignment carries 
+        over from the previous scale as long as it still maximizes welfare, 
+        which is checked for all samples at once by negative-cycle detection on 
+        the envy graph. The assignment program is only solved again for samples
+        whose matching changed, and kept assignments still go through the 
+        seeded tiebreak. The pricing program of a kept assignment changes only
+        in its right-hand side, so each sample keeps a WarmStartContext that 
+        starts it from the previous scale's basis. The number of repairs per 
+        scale is saved with the results.
+        """
+        valuations = self.get_starting_valuations_batch(self.num_samples)
+        uniforms = self.random_state.uniform(0, 1, size=valuations.shape)
+        diagonal = np.arange(self.n)
+
+        self.fractions = {}
+        self.repairs = {}
+        for method_name in self.methods:
+            assert(method_name in globals())
+            method_class = globals()[method_name]
+            fractions = []
+            repairs = []
+            assignments = None
+            contexts = [WarmStartContext(SolverContext.get_default(0)) 
+                        for _ in range(self.num_samples)]
+            for noise_scale in self.noise_scales:
+                noisy_valuations = self.perturb_valuations_common(valuations, uniforms,
+                                                                  noise_scale)
+                kept = np.zeros(self.num_samples, dtype=bool)
+                if assignments is None:
+                    assignments = np.zeros((self.num_samples, self.n), dtype=int)
+                else:
+                    distances = get_shortest_paths(build_envy_graph(noisy_valuations,
+                                                                    assignments))
+                    kept = np.all(distances[:, diagonal, diagonal] >= -1e-9, axis=1)
+                    # shortest paths from a virtual source to every room
+                    supports = np.minimum(np.min(distances, axis=1), 0)
+
+                prices = np.zeros((self.num_samples, self.n))
+                solved = np.ones(self.num_samples, dtype=bool)
+                for i in range(self.num_samples):
+                    method = method_class(noisy_valuations[i], verbosity=0, 
+                                          tiebreak=self.get_tiebreak(),
+                                          context=contexts[i])
+                    try:
+                        if kept[i]:
+                            method.assignments = assignments[i]
+                            method.assignment_prices = supports[i]
+                            if method.tiebreak is not None:
+                                assignments[i] = method.break_ties()
+                        else:
+                            assignments[i] = method.solve_assignments()
+                        prices[i] = method.solve_prices()
+                    except SolverError:
+                        solved[i] = False
+
+                envy_free = solved & get_envy_free(valuations, assignments, prices)
+                fractions.append(float(np.mean(envy_free)))
+                repairs.append(int(np.sum(~kept)))
+                num_warm = sum(context.num_warm for context in contexts)
+                logging.info(f"{method_name} at scale {noise_scale:.4g}: "
+                             f"{repairs[-1]} of {self.num_samples} assignments solved, "
+                             f"{num_warm} pricing programs warm-started so far.",
+                             extra={"data": {"method": method_name, 
+                                             "noise_scale": noise_scale,
+                                             "num_repairs": repairs[-1]}})
+            self.fractions[method_name] = fractions
+            self.repairs[method_name] = repairs
+
+    def run_sequential(self):
+        """
+        Estimates the fractions of envy-free splits one sample at a time.
+        """
         self.fractions = {}
         for method_name in self.methods: 
             assert(method_name in globals())
@@ -87,26 +276,28 @@ class NoisySimulation(Process):
                 fractions.append(frac_envy_free)
             self.fractions[method_name] = fractions
 
-        self.visualize()
+    def save_results(self):
+        """
+        Saves the noise scales and fractions of envy-free splits, or the certified
+        radii, to results.json, from which the plot process renders figures.
+        """
+        if hasattr(self, "radii"):
+            results = {"radii": self.radii}
+        else:
+            results = {"noise_scales": self.noise_scales.tolist(),
+                       "fractions": self.fractions}
+            if hasattr(self, "repairs"):
+                results["repairs"] = self.repairs
+        with open(os.path.join(self.dir, "results.json"), "w") as f:
+            json.dump(results, f, indent=4)
     
     def visualize(self):
         """
         """
-        sns.set_style("whitegrid")
-        for method_name, fractions in self.fractions.items(): 
-            plt.plot(self.noise_scales[::-1], fractions[::-1], label=method_name)
-            plt.legend()
-            plt.xscale(self.x_scale)
-
-        figures_dir = os.path.join(self.dir, "figures")
-        if not os.path.exists(figures_dir):
-            os.makedirs(figures_dir)
-        
-        plt.savefig(os.path.join(figures_dir, "simulation.pdf"))
-        
-
-        
-                
-
-        
-
+        if hasattr(self, "radii"):
+            plot_radii(self.radii, getattr(self, "x_scale", "log"),
+                       os.path.join(self.dir, "figures", "radii.pdf"))
+            return
+        plot_fractions(list(self.noise_scales), self.fractions, 
+                       getattr(self, "x_scale", "log"),
+                       os.path.join(self.dir, "figures", "simulation.pdf"))
@@ -0,0 +1,154 @@
+"""
+Renders figures from persisted experiment results, so that figures can be redrawn
+without re-running experiments and many experiment directories can be plotted
+in parallel.
+"""
+import glob
+import json
+import os
+from multiprocessing import Pool
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import seaborn as sns
+
+from utils import Process
+
+
+class Plot(Process):
+    """
+    Plots the persisted results of an experiment directory:
+        results.json                    fractions of a NoisySimulation sweep or
+                                        its certified noise radii
+        results/group_plot*.csv         group percentages of SurveyResults
+    """
+
+    def __init__(self, dir):
+        super().__init__(dir)
+
+    def run(self):
+        """
+        Renders a figure for each kind of result found in the directory.
+        """
+        results_path = os.path.join(self.dir, "results.json")
+        if os.path.exists(results_path):
+            with open(results_path) as f:
+                results = json.load(f)
+            if "fractions" in results:
+                plot_fractions(results["noise_scales"], results["fractions"],
+                               getattr(self, "x_scale", "log"),
+                               os.path.join(self.dir, "figures", "simulation.pdf"))
+            if "radii" in results:
+                plot_radii(results["radii"], getattr(self, "x_scale", "log"),
+                           os.path.join(self.dir, "figures", "radii.pdf"))
+
+        for table_path in glob.glob(os.path.join(self.dir, "results", "group_plot*.csv")):
+            name = os.path.splitext(os.path.basename(table_path))[0]
+            plot_groups(pd.read_csv(table_path), os.path.join(self.dir, f"{name}.pdf"))
+
+
+def plot_fractions(noise_scales, fractions, x_scale, path):
+    """
+    Plots the fraction of envy-free splits against the noise scale for each method.
+    args:
+        noise_scales    (list)  the noise scales of the sweep
+        fractions       (dict)  method name to list of fractions, one per noise scale
+        x_scale         (str)   scale of the x axis, e.g. "log"
+        path            (str)   where to save the figure
+    """
+    sns.set_style("whitegrid")
+    figure, axes = plt.subplots()
+    for method_name, method_fractions in fractions.items():
+        axes.plot(noise_scales[::-1], method_fractions[::-1], label=method_name)
+    axes.legend()
+    axes.set_xscale(x_scale)
+    save_figure(figure, path)
+
+
+def plot_radii(radii, x_scale, path):
+    """
+    Plots the fraction of households whose split is certified envy-free against
+    the noise radius for each method.
+    args:
+        radii           (dict)  method name to list of certified radii, one per 
+                        household
+        x_scale         (str)   scale of the x axis, e.g. "log"
+        path            (str)   where to save the figure
+    """
+    sns.set_style("whitegrid")
+    figure, axes = plt.subplots()
+    for method_name, method_radii in radii.items():
+        method_radii = np.sort(method_radii)
+        fractions = 1 - np.arange(len(method_radii)) / len(method_radii)
+        axes.step(method_radii, fractions, where="post", label=method_name)
+    axes.legend()
+    axes.set_xscale(x_scale)
+    axes.set_xlabel("noise radius")
+    axes.set_ylabel("fraction certified envy-free")
+    save_figure(figure, path)
+
+
+def plot_failures(fractions, path):
+    """
+    Plots the fraction of sampled instances without envy-free prices for each 
+    method.
+    args:
+        fractions       (dict)  method name to a list holding its fraction
+        path            (str)   where to save the figure
+    """
+    sns.set_style("whitegrid")
+    figure, axes = plt.subplots()
+    names = list(fractions)
+    axes.bar(np.arange(len(names)), [fractions[name][-1] for name in names])
+    axes.set_xticks(np.arange(len(names)))
+    axes.set_xticklabels(names)
+    axes.set_ylabel("fraction without solution")
+    save_figure(figure, path)
+
+
+def plot_groups(table, path):
+    """
+    Plots the percentage of responses choosing each option, grouped by house.
+    args:
+        table   (DataFrame) with columns "house", "choice" and "percent"
+        path    (str)   where to save the figure
+    """
+    figure, axes = plt.subplots()
+    sns.barplot(x="house", y="percent", hue="choice", data=table, ax=axes)
+    save_figure(figure, path)
+
+
+def save_figure(figure, path):
+    """
+    Saves figure to path, creating its directory, and releases it.
+    """
+    figures_dir = os.path.dirname(path)
+    if not os.path.exists(figures_dir):
+        os.makedirs(figures_dir)
+    figure.savefig(path)
+    plt.close(figure)
+
+
+def plot_dir(dir):
+    """
+    Plots the persisted results of one experiment directory.
+    """
+    Plot(dir).run()
+    return dir
+
+
+def plot_dirs(dirs, num_workers=1):
+    """
+    Plots the persisted results of many experiment directories, each in a
+    worker process.
+    args:
+        dirs            (list)  experiment directories
+        num_workers     (int)   number of worker processes
+    """
+    if num_workers <= 1:
+        return [plot_dir(dir) for dir in dirs]
+    with Pool(num_workers) as pool:
+        return pool.map(plot_dir, dirs)
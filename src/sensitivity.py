@@ -0,0 +1,280 @@
+"""
+Computes how the assignments and prices of a split move as one agent's valuation
+for one room varies, without re-solving the split at every point of the sweep.
+"""
+
+import numpy as np
+
+from methods.utility import MaxMinUtilityMethod
+
+
+class CanonicalContext():
+    """
+    Wraps a solver context so that every linear program returns the same one
+    of its optimal solutions: the one minimizing a fixed weighted sum of the
+    prices, found by a second program over the optimal solutions of the first.
+    The weights are positive and generic, so the minimizer is unique. The duals
+    are those of the first program. Everything else is left to the wrapped
+    context.
+    """
+
+    def __init__(self, context, weights, tolerance=1e-9):
+        """
+        Initializes the context.
+        args:
+            context         (SolverContext) the context solving the programs
+            weights         (ndarray)   1D array of shape (m,) of price weights
+            tolerance       (float)     objective above the optimum, relative to
+                            its size, still counted as optimal
+        """
+        self.context = context
+        self.weights = weights
+        self.tolerance = tolerance
+
+    def __getattr__(self, name):
+        return getattr(self.context, name)
+
+    def lp(self, c, G, h, A, b):
+        """
+        Solves the linear program of SolverContext.lp, breaking ties by the
+        weighted sum of the prices, the first len(weights) variables.
+        """
+        status, x, z, y = self.context.lp(c, G, h, A, b)
+        c = np.asarray(c, dtype=float).reshape(-1)
+        optimum = np.dot(c, x)
+        tie_c = np.zeros(len(c))
+        tie_c[:len(self.weights)] = self.weights
+        tie_G = np.concatenate([np.asarray(G, dtype=float), c.reshape(1, -1)], axis=0)
+        tie_h = np.append(np.asarray(h, dtype=float).reshape(-1), 
+                          optimum + self.tolerance * max(1, abs(optimum)))
+        _, x, _, _ = self.context.lp(tie_c, tie_G, tie_h, A, b)
+        return status, x, z, y
+
+
+class SensitivitySweep():
+    """
+    Parametric solve of a rent splitting method over the valuation of one
+    agent for one room. The valuation of `agent` for `room` is shifted by a
+    parameter delta.
+
+    The assignment is piecewise constant in delta with at most one breakpoint:
+    below it the welfare-maximizing matching that avoids (agent, room) wins,
+    above it the one that uses it. Both are found with two assignment solves.
+    For a fixed assignment the right-hand side of the pricing program is linear
+    in delta. Every pricing program is solved with ties between its optima 
+    broken the same way, see CanonicalContext, so the prices are a piecewise 
+    linear function of delta. Probes off the known pieces also solve a step to
+    their sides, which gives the slopes of the pieces they lie on, and the next
+    probe is placed where the pieces of two probes meet. That is the breakpoint when 
+    only one lies between them, so a breakpoint takes a few solves.
+    Example usage:
+        sweep = SensitivitySweep(valuations, agent=0, room=2)
+        assignments, prices = sweep.sweep(np.linspace(-0.1, 0.1, 200))
+    """
+
+    def __init__(self, valuations, agent, room,
+                 method_class=MaxMinUtilityMethod, method_kwargs=None,
+                 tolerance=1e-7, step=1e-6, max_probes=100):
+        """
+        Initializes the sweep.
+        args:
+            valuations      (ndarray)   2D matrix of shape (n, m) where position (i, j)
+                            gives the valuation of agent i for room j.
+            agent           (int)   the agent whose valuation varies
+            room            (int)   the room whose valuation varies
+            method_class    (class) a class of LPMethod type
+            method_kwargs   (dict)  extra keyword arguments for the method,
+                            e.g. {"priorities": priorities}
+            tolerance       (float) maximum deviation from a linear piece 
+                            accepted as lying on it
+            step            (float) the distance to the sides of a probe at 
+                            which the slopes are measured
+            max_probes      (int)   maximum number of probes per segment, after
+                            which the remaining pieces are interpolated
+        """
+        self.valuations = valuations
+        self.agent = agent
+        self.room = room
+        self.method_class = method_class
+        self.method_kwargs = {} if method_kwargs is None else method_kwargs
+        self.tolerance = tolerance
+        self.step = step
+        self.max_probes = max_probes
+        self.n, self.m = self.valuations.shape
+        # generic positive weights of the tie breaking, fixed per sweep
+        self.weights = np.random.RandomState(0).uniform(1, 2, size=self.m)
+
+        self.num_solves = 0
+        self.breakpoint = None
+
+    def get_method(self, delta):
+        """
+        Builds a method for the valuations shifted by delta.
+        args:
+            delta   (float) shift of the valuation of agent for room
+        """
+        valuations = self.valuations.copy()
+        valuations[self.agent, self.room] += delta
+        return self.method_class(valuations, verbosity=0, **self.method_kwargs)
+
+    def solve_assignment_breakpoint(self):
+        """
+        Finds the value of delta at which the optimal assignment switches from
+        the best matching avoiding (agent, room) to the best matching using it.
+        returns:
+            self.breakpoint     (float) the switching value of delta
+        """
+        method = self.get_method(0.0)
+        welfare_valuations = method.get_welfare_valuations()
+
+        # the welfare objective is linear in delta, slope of the varying entry
+        slope = (self.get_method(1.0).get_welfare_valuations()[self.agent, self.room] -
+                 welfare_valuations[self.agent, self.room])
+        assert(slope > 0)
+
+        # force and forbid the pair by making it dominant or dominated
+        big = (np.sum(np.abs(welfare_valuations)) + 1) / slope
+        self.assignments_without = self.solve_assignments(-big)
+        self.assignments_with = self.solve_assignments(big)
+
+        agents = np.arange(self.n)
+        welfare_without = np.sum(welfare_valuations[agents, self.assignments_without])
+        welfare_with = np.sum(welfare_valuations[agents, self.assignments_with])
+        self.breakpoint = (welfare_without - welfare_with) / slope
+        return self.breakpoint
+
+    def solve_assignments(self, delta):
+        """
+        Solves the assignment problem at delta.
+        args:
+            delta   (float) shift of the valuation of agent for room
+        """
+        self.num_solves += 1
+        return self.get_method(delta).solve_assignments()
+
+    def get_assignments(self, delta):
+        """
+        Returns the optimal assignments at delta.
+        args:
+            delta   (float) shift of the valuation of agent for room
+        """
+        if self.breakpoint is None:
+            self.solve_assignment_breakpoint()
+        if delta >= self.breakpoint:
+            return self.assignments_with
+        return self.assignments_without
+
+    def solve_prices(self, delta, assignments):
+        """
+        Solves the pricing program at delta for fixed assignments, breaking 
+        ties between optimal prices with self.weights.
+        """
+        method = self.get_method(delta)
+        method.context = CanonicalContext(method.context, self.weights)
+        method.assignments = assignments
+        self.num_solves += 1
+        return method.solve_prices()
+
+    def get_slope(self, delta, prices, assignments, direction):
+        """
+        Measures the slope of the prices a step to one side of delta. 
+        args:
+            delta       (float)     where prices were solved
+            prices      (ndarray)   1D array of shape (m,), the prices at delta
+            direction   (int)       1 for the right side, -1 for the left side
+        returns:
+            slope       (ndarray)   1D array of shape (m,)
+        """
+        side_prices = self.solve_prices(delta + direction * self.step, assignments)
+        return (side_prices - prices) * direction / self.step
+
+    def track_prices(self, start, end, assignments):
+        """
+        Finds the knots of the piecewise linear price trajectory on [start, end]
+        for fixed assignments.
+        returns:
+            knots   (list)  of (delta, prices) tuples sorted by delta
+        """
+        if end - start <= 2 * self.step:
+            return [(delta, self.solve_prices(delta, assignments)) 
+                    for delta in sorted({start, end})]
+        start_prices = self.solve_prices(start, assignments)
+        start_slope = self.get_slope(start, start_prices, assignments, 1)
+        end_prices = self.solve_prices(end, assignments)
+        end_slope = self.get_slope(end, end_prices, assignments, -1)
+
+        def on_piece(delta, prices, knot, knot_prices, slope):
+            return np.max(np.abs(knot_prices + slope * (delta - knot) - prices)) <= self.tolerance
+
+        stack = [(start, start_prices, start_slope, end, end_prices, end_slope)]
+        knots = []
+        num_probes = 0
+        while stack:
+            left, left_prices, left_slope, right, right_prices, right_slope = stack.pop()
+            if (on_piece(right, right_prices, left, left_prices, left_slope) or 
+                    right - left <= 2 * self.step or num_probes >= self.max_probes):
+                knots.append((left, left_prices))
+                continue
+
+            # where the pieces of both ends meet, or the middle if they do not
+            slopes = left_slope - right_slope
+            offsets = (right_prices - right_slope * right) - (left_prices - left_slope * left)
+            middle = (left + right) / 2
+            if np.dot(slopes, slopes) > 0:
+                middle = np.dot(slopes, offsets) / np.dot(slopes, slopes)
+            if not left + self.step < middle < right - self.step:
+                middle = (left + right) / 2
+
+            num_probes += 1
+            middle_prices = self.solve_prices(middle, assignments)
+            on_left = on_piece(middle, middle_prices, left, left_prices, left_slope)
+            on_right = on_piece(middle, middle_prices, right, right_prices, right_slope)
+            if on_left and on_right:
+                knots.append((left, left_prices))
+                knots.append((middle, middle_prices))
+                continue
+
+            middle_left = (left_slope if on_left else 
+                           self.get_slope(middle, middle_prices, assignments, -1))
+            middle_right = (right_slope if on_right else 
+                            self.get_slope(middle, middle_prices, assignments, 1))
+            # push the right half first so knots come out sorted
+            stack.append((middle, middle_prices, middle_right, right, right_prices, right_slope))
+            stack.append((left, left_prices, left_slope, middle, middle_prices, middle_left))
+        knots.append((end, end_prices))
+        return knots
+
+    def sweep(self, deltas):
+        """
+        Computes the assignment and price trajectories at each delta.
+        args:
+            deltas  (ndarray)   1D array of shifts of the valuation of agent for room
+        returns:
+            assignments     (ndarray)   2D array of shape (len(deltas), n), the
+                            assignments at each delta
+            prices          (ndarray)   2D array of shape (len(deltas), m), the
+                            prices at each delta
+        """
+        deltas = np.asarray(deltas, dtype=float)
+        if self.breakpoint is None:
+            self.solve_assignment_breakpoint()
+
+        # split the sweep at the assignment breakpoint
+        self.knots = []
+        assignments = np.zeros((len(deltas), self.n), dtype=int)
+        prices = np.zeros((len(deltas), self.m))
+        below = deltas < self.breakpoint
+        for mask, curr_assignments in [(below, self.assignments_without),
+                                       (~below, self.assignments_with)]:
+            if not np.any(mask):
+                continue
+            knots = self.track_prices(np.min(deltas[mask]), np.max(deltas[mask]),
+                                      curr_assignments)
+            knot_deltas = np.array([delta for delta, _ in knots])
+            knot_prices = np.stack([knot for _, knot in knots], axis=0)
+            for room in range(self.m):
+                prices[mask, room] = np.interp(deltas[mask], knot_deltas,
+                                               knot_prices[:, room])
+            assignments[mask] = curr_assignments
+            self.knots.extend(knots)
+        return assignments, prices
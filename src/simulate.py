@@ -3,16 +3,20 @@
 """
 import logging
 import os
+from multiprocessing import Pool
 
 import numpy as np
-import seaborn as sns
-import matplotlib.pyplot as plt 
 
+from methods.envy_graph import check_feasibility
+from methods.solver import SolverError
 from methods.priority import PriorityMethod
 from methods.price import MaxMinPriceMethod, MinMaxPriceMethod
 from methods.utility import MaxMinUtilityMethod
 from methods.demand import MinMaxDemandMethod
-from utils import Process
+from methods.slack import MaxMinSlackMethod
+from plot import plot_failures
+from sweep import SweepRunner
+from utils import Process, sample_dirichlet
 
 
 class Simulation(Process):
@@ -40,66 +44,160 @@ class Simulation(Process):
         valuations = valuations.reshape(-1, self.n)
         perturbed_valuations = np.zeros_like(valuations)
         for i in range(valuations.shape[0]):
-            perturbed_valuations[i, :] = np.random.dirichlet(valuations[i, :] * scale)
+            perturbed_valuations[i, :] = self.random_state.dirichlet(valuations[i, :] *
+                                                                     scale)
         return perturbed_valuations
     
+    def get_starting_valuations_batch(self, num_samples):
+        """
+        Samples num_samples starting valuations at once, distributed as 
+        get_starting_valuations, of the float dtype given by "dtype".
+        returns:
+            valuations  (ndarray)   3D array of shape (num_samples, n, n)
+        """
+        dtype = getattr(self, "dtype", "float64")
+        uniform = np.ones((num_samples, self.n)) / self.n
+        means = sample_dirichlet(uniform * self.mean_scale, 
+                                 random_state=self.random_state)
+        # every agent of a sample shares its concentrations, which are only
+        # broadcast, so no array of the size of all valuations is allocated
+        alphas = np.broadcast_to(means[:, np.newaxis, :] * self.initial_scale,
+                                 (num_samples, self.n, self.n))
+        return sample_dirichlet(alphas, dtype=dtype, random_state=self.random_state)
+
     def get_starting_priorities(self):
         """
         """
-        return np.random.uniform(0, 1, size=self.n)
+        return self.random_state.uniform(0, 1, size=self.n)
 
     def simulate_split(self, method_class, valuations, priorities):
         """
+        Solves one instance, passing the priorities only to priority methods.
         """
-        method = method_class(valuations, priorities, verbosity=0) 
+        if issubclass(method_class, PriorityMethod):
+            method = method_class(valuations, priorities, verbosity=0, 
+                                  tiebreak=self.get_tiebreak())
+        else:
+            method = method_class(valuations, verbosity=0, tiebreak=self.get_tiebreak())
         assignments, prices = method.solve()
         return valuations, priorities, assignments, prices
 
     def run(self):
         """
+        Estimates for each method the fraction of sampled instances for which no
+        envy-free prices exist. If "fast_feasibility" is set, instances are checked 
+        in batches by negative-cycle detection on the scaled envy graph instead of 
+        solving the LP. If "shared_memory" is set, the LPs are solved over 
+        "num_workers" processes on shared memory. Failing instances are saved to 
+        failures_{method}.npz.
+        """
+        runner = None
+        if getattr(self, "shared_memory", False):
+            runner = SweepRunner(self, num_workers=getattr(self, "num_workers", 1),
+                                 chunk_size=getattr(self, "batch_size", 1000))
+
+        try:
+            self.run_methods(runner)
+        finally:
+            if runner is not None:
+                runner.close()
+        print(self.fractions)
+
+    def run_methods(self, runner=None):
+        """
+        Estimates the fraction of sampled instances without solution for each 
+        method, solving on the runner's shared memory if given. 
         """
         self.fractions = {}
         for method_name in self.methods: 
             assert(method_name in globals())
             method_class = globals()[method_name] 
             fractions = []
-            count_no_soln = 0
-            for i in range(self.num_samples):
-                valuations = self.get_starting_valuations()
-                priorities = self.get_starting_priorities()
-                try:
-                    valuations, priorities, assignments, prices = self.simulate_split(method_class, valuations, priorities)
-                except:
-                    logging.info("No Solution-")
-                    logging.info(valuations)
-                    logging.info(priorities)
-                    logging.info("-----------------")
-
-                    count_no_soln += 1
-                
-            frac_no_soln= count_no_soln / self.num_samples
+            if getattr(self, "fast_feasibility", False):
+                valuations, priorities = self.find_infeasible_fast(method_class)
+            elif runner is not None:
+                solved, _ = runner.run(method_class)
+                valuations = runner.arrays["valuations"][~solved]
+                priorities = runner.arrays["priorities"][~solved]
+            else:
+                valuations, priorities = self.find_infeasible(method_class)
+            self.save_failures(method_name, valuations, priorities)
+
+            frac_no_soln = len(valuations) / self.num_samples
             fractions.append(frac_no_soln)
             self.fractions[method_name] = fractions
-        print(self.fractions)
-    
-    def visualize(self):
+            logging.info(f"{method_name}: {len(valuations)} of {self.num_samples} " 
+                         "samples without solution.",
+                         extra={"data": {"method": method_name, 
+                                         "num_failures": len(valuations),
+                                         "num_samples": self.num_samples}})
+
+    def find_infeasible(self, method_class):
+        """
+        Solves sampled instances one at a time and collects those without solution.
+        returns:
+            valuations  (ndarray)   3D array of shape (k, n, n) of failing valuations
+            priorities  (ndarray)   2D array of shape (k, n) of failing priorities
         """
+        failed_valuations = []
+        failed_priorities = []
+        for i in range(self.num_samples):
+            valuations = self.get_starting_valuations()
+            priorities = self.get_starting_priorities()
+            try:
+                self.simulate_split(method_class, valuations, priorities)
+            except SolverError:
+                logging.info("No solution.", extra={"data": {"sample": i}})
+                failed_valuations.append(valuations)
+                failed_priorities.append(priorities)
+        return (np.array(failed_valuations).reshape(-1, self.n, self.n),
+                np.array(failed_priorities).reshape(-1, self.n))
+
+    def find_infeasible_fast(self, method_class):
+        """
+        Checks sampled instances in batches of "batch_size" for the existence of 
+        envy-free prices, over "num_workers" processes, and collects those without.
+        returns:
+            valuations  (ndarray)   3D array of shape (k, n, n) of failing valuations
+            priorities  (ndarray)   2D array of shape (k, n) of failing priorities
         """
-        sns.set_style("whitegrid")
-        for method_name, fractions in self.fractions.items(): 
-            plt.plot(self.noise_scales[::-1], fractions[::-1], label=method_name)
-            plt.legend()
-            plt.xscale(self.x_scale)
+        batch_size = getattr(self, "batch_size", 1000)
+        num_workers = getattr(self, "num_workers", 1)
 
-        figures_dir = os.path.join(self.dir, "figures")
-        if not os.path.exists(figures_dir):
-            os.makedirs(figures_dir)
-        
-        plt.savefig(os.path.join(figures_dir, "simulation.pdf"))
-        
+        batches = []
+        for start in range(0, self.num_samples, batch_size):
+            num_samples = min(batch_size, self.num_samples - start)
+            valuations = self.get_starting_valuations_batch(num_samples)
+            priorities = self.random_state.uniform(0, 1, size=(num_samples, self.n))
+            priorities = priorities.astype(valuations.dtype, copy=False)
+            if method_class is PriorityMethod:
+                scale = 2 * priorities
+            else:
+                scale = np.ones_like(priorities)
+            batches.append((valuations, priorities, scale))
 
-        
-                
+        args = [(valuations, scale) for valuations, _, scale in batches]
+        if num_workers > 1:
+            with Pool(num_workers) as pool:
+                feasible = pool.starmap(check_feasibility, args)
+        else:
+            feasible = [check_feasibility(*arg) for arg in args]
 
-        
+        return (np.concatenate([valuations[~curr_feasible] for (valuations, _, _), curr_feasible 
+                                in zip(batches, feasible)], axis=0),
+                np.concatenate([priorities[~curr_feasible] for (_, priorities, _), curr_feasible 
+                                in zip(batches, feasible)], axis=0))
 
+    def save_failures(self, method_name, valuations, priorities):
+        """
+        Saves the instances without solution in a compressed binary file.
+        """
+        np.savez_compressed(os.path.join(self.dir, f"failures_{method_name}.npz"),
+                            valuations=valuations, priorities=priorities)
+    
+    def visualize(self):
+        """
+        Plots the fraction of instances without solution of each method to 
+        figures/simulation.pdf.
+        """
+        plot_failures(self.fractions, os.path.join(self.dir, "figures", "simulation.pdf"))
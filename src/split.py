@@ -5,19 +5,24 @@ Defines a class for managing a rent splitting problem
 import os
 
 import numpy as np
-from cvxopt import solvers
 import pandas as pd
 
 from methods.price import MaxMinPriceMethod, MinMaxPriceMethod
 from methods.utility import MaxMinUtilityMethod
 from methods.demand import MinMaxDemandMethod
+from methods.slack import MaxMinSlackMethod
 from methods.priority import PriorityMethod
+from methods.envy_index import EnvyIndex
+from methods.online import OnlineSession
+from sensitivity import SensitivitySweep
 from utils import Process
 
 class SplitCli(Process):
     """
     Holds one instance of a rent splitting problem parameterized
-    by a dict describing the problem.
+    by a dict describing the problem. Optionally "m" gives the number of
+    rooms when there are more rooms than agents, and "capacities" the 
+    number of agents each room holds.
     Example:
     {
         "n": 3,
@@ -84,23 +89,29 @@ class SplitCli(Process):
         Preprocesses valuations by converting to ndarray and normalizing
         so valuations sum to 1.
         """
-        # ensure correct length
+        # ensure correct length, there may be more rooms than agents
+        self.m = getattr(self, "m", self.n)
+        self.capacities = np.array(getattr(self, "capacities", np.ones(self.m)))
+        assert(len(self.capacities) == self.m)
+        assert(np.sum(self.capacities) >= self.n)
         assert(len(self.agent_to_valuations) == self.n)
         for agent, v in self.agent_to_valuations.items():
             assert(np.sum(v) == self.total_rent)
-            assert(len(v) == self.n)
-
-        valuations = []
-        self.priorities = np.full(len(self.agent_to_valuations), 0.5)
-        agents = []
-        for i, (agent, curr_valuations) in enumerate(self.agent_to_valuations.items()):
-            # scale between 0 and 1
-            valuations.append(np.array(curr_valuations) / self.total_rent)
-            agents.append(agent)
-            if hasattr(self, "agent_to_priority"):
-                self.priorities[i] = self.agent_to_priority[agent]
-
-        self.valuations = np.stack(valuations, axis=0)
+            assert(len(v) == self.m)
+
+        agents = list(self.agent_to_valuations.keys())
+
+        # scale between 0 and 1
+        valuations = np.array(list(self.agent_to_valuations.values()), dtype=float)
+        valuations /= self.total_rent
+
+        if hasattr(self, "agent_to_priority"):
+            self.priorities = np.array([self.agent_to_priority[agent] for agent in agents],
+                                       dtype=float)
+        else:
+            self.priorities = np.full(self.n, 0.5)
+
+        self.valuations = valuations
         self.agents = agents
 
         return self.agents, self.valuations
@@ -109,15 +120,19 @@ class SplitCli(Process):
               method_name="MaxMinUtilityMethod",
               method_class=MaxMinUtilityMethod):
         """
-        Solves the splitting instance with the specified method.
+        Solves the splitting instance with the specified method, on the solver
+        backend given by "backend", "glpk" by default.
         args:
             method_class    (class) a class of Method type.
         TODO: implement base method class
         """
+        backend = getattr(self, "backend", "glpk")
         if method_name == "PriorityMethod":
-            method = method_class(self.valuations, self.priorities)
+            method = method_class(self.valuations, self.priorities,
+                                  capacities=self.capacities, backend=backend)
         else:
-            method = method_class(self.valuations)
+            method = method_class(self.valuations, capacities=self.capacities,
+                                  backend=backend)
         assignments, prices = method.solve()
         self.results[method_name] = {"assignments": assignments,
                                      "prices": prices}
@@ -127,7 +142,9 @@ class SplitCli(Process):
 class Split():
     """
     Holds one instance of a rent splitting problem parameterized
-    by a dict describing the problem.
+    by a dict describing the problem. Optionally "m" gives the number of
+    rooms when there are more rooms than agents, and "capacities" the 
+    number of agents each room holds.
     Example:
     {
         "n": 3,
@@ -166,6 +183,23 @@ class Split():
                 for i, agent in enumerate(self.agents)}
         return data
 
+    def get_result_arrays(self):
+        """
+        Returns the solution as arrays in units of rent, with one entry per agent 
+        in the order of "agents". Cheaper to build and serialize than get_results.
+        returns:
+            results     (dict)  "agents", "rooms", "prices", "valuations" and 
+                        "utilities"
+        """
+        assert(self.solved)
+        prices = self.prices[self.assignments] * self.total_rent
+        valuations = self.valuations[np.arange(self.n), self.assignments] * self.total_rent
+        return {"agents": self.agents,
+                "rooms": self.assignments,
+                "prices": prices,
+                "valuations": valuations,
+                "utilities": valuations - prices}
+
     def output_results(self):
         """
         Outputs solutions of the rent splitting problem.
@@ -189,42 +223,118 @@ class Split():
     def run(self):
         """
         """
-        assert(self.method in globals())
-
-        method_class = globals()[self.method]
-        self.solve(method_class=method_class)
+        self.solve(method_class=self.get_method_class())
         self.output_results()
 
+    def get_method_class(self):
+        """
+        Returns the class of the method named by "method", MaxMinUtilityMethod 
+        if not given.
+        """
+        method = getattr(self, "method", "MaxMinUtilityMethod")
+        assert(method in globals())
+        return globals()[method]
+
     def preprocess_valuations(self):
         """
         Preprocesses valuations by converting to ndarray and normalizing
-        so valuations sum to 1.
+        so valuations sum to 1, in place. "dtype" sets the float dtype of the
+        valuations, e.g. "float32". "agent_to_priority" optionally gives the
+        priority of each agent for PriorityMethod, 0.5 for all if not given.
         """
-        # ensure correct length
+        # ensure correct length, there may be more rooms than agents
+        self.m = getattr(self, "m", self.n)
+        self.capacities = np.array(getattr(self, "capacities", np.ones(self.m)))
+        assert(len(self.capacities) == self.m)
+        assert(np.sum(self.capacities) >= self.n)
         assert(len(self.agent_to_valuations) == self.n)
-        for agent, v in self.agent_to_valuations.items():
-            assert(np.sum(v) == self.total_rent)
-            assert(len(v) == self.n)
+        agents = list(self.agent_to_valuations.keys())
 
-        valuations = []
-        agents = []
-        for agent, curr_valuations in self.agent_to_valuations.items():
-            # scale between 0 and 1
-            valuations.append(np.array(curr_valuations) / self.total_rent)
-            agents.append(agent)
+        valuations = np.array(list(self.agent_to_valuations.values()),
+                              dtype=getattr(self, "dtype", "float64"))
+        assert(valuations.shape == (self.n, self.m))
+        assert(np.all(np.sum(valuations, axis=1) == self.total_rent))
 
-        self.valuations = np.stack(valuations, axis=0)
+        # scale between 0 and 1
+        valuations /= self.total_rent
+
+        if hasattr(self, "agent_to_priority"):
+            self.priorities = np.array([self.agent_to_priority[agent] for agent in agents],
+                                       dtype=float)
+        else:
+            self.priorities = np.full(self.n, 0.5)
+
+        self.valuations = valuations
         self.agents = agents
 
         return self.agents, self.valuations
 
-    def solve(self, method_class=MaxMinUtilityMethod):
+    def solve(self, method_class=MaxMinUtilityMethod, verbosity=1):
         """
-        Solves the splitting instance with the specified method.
+        Solves the splitting instance with the specified method, on the solver
+        backend given by "backend", "glpk" by default.
         args:
             method_class    (class) a class of Method type.
+            verbosity       (int)   0=no output, 1=step output, 2=solver output
         TODO: implement base method class
         """
-        method = method_class(self.valuations)
+        backend = getattr(self, "backend", "glpk")
+        if issubclass(method_class, PriorityMethod):
+            method = method_class(self.valuations, self.priorities, verbosity=verbosity,
+                                  capacities=self.capacities, backend=backend)
+        else:
+            method = method_class(self.valuations, verbosity=verbosity,
+                                  capacities=self.capacities, backend=backend)
         self.assignments, self.prices = method.solve()
+        self.timings = method.timings
         self.solved = True
+
+    def get_index(self):
+        """
+        Builds an index of the household's envy graph, which answers questions 
+        such as the envy-free price range of each room or the cheapest method for
+        an agent without solving again. It is built on the solver backend given
+        by "backend", "glpk" by default.
+        returns:
+            index           (EnvyIndex) in units of rent, with agents by name
+        """
+        return EnvyIndex(self.valuations, capacities=self.capacities, 
+                         agents=self.agents, total_rent=self.total_rent,
+                         backend=getattr(self, "backend", "glpk"))
+
+    def get_session(self):
+        """
+        Starts an online session from the household, to which agents and rooms
+        can then be added and removed without solving from scratch.
+        returns:
+            session         (OnlineSession) in units of rent, with agents by name
+                            and rooms numbered from 0
+        """
+        session = OnlineSession(total_rent=self.total_rent)
+        for room, capacity in enumerate(self.capacities):
+            session.add_room(room, capacity=int(capacity))
+        for agent, valuations in zip(self.agents, self.valuations):
+            session.add_agent(agent, dict(enumerate(valuations * self.total_rent)))
+        return session
+
+    def sensitivity(self, agent, room, deltas, method_class=MaxMinUtilityMethod):
+        """
+        Computes how the assignments and prices change as the valuation of
+        agent for room varies, without re-solving at every point.
+        args:
+            agent           (str)   name of the agent whose valuation varies
+            room            (int)   the room whose valuation varies
+            deltas          (ndarray)   1D array of changes to the valuation, in
+                            units of rent
+            method_class    (class) a class of Method type.
+        returns:
+            assignments     (ndarray)   2D array of shape (len(deltas), n) of
+                            assignments at each delta
+            prices          (ndarray)   2D array of shape (len(deltas), m) of
+                            prices at each delta, in units of rent
+        """
+        sweep = SensitivitySweep(self.valuations, self.agents.index(agent), room,
+                                 method_class=method_class,
+                                 method_kwargs={"capacities": self.capacities})
+        assignments, prices = sweep.sweep(np.asarray(deltas) / self.total_rent)
+        return assignments, prices * self.total_rent
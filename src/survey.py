@@ -1,27 +1,124 @@
 """
 """
+import json
 import os
 
 import numpy as np
-from scipy.stats import binom_test
+from scipy.stats import binom
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 
+from plot import plot_groups
 from utils import Process
 
+# dtypes of the metadata columns in question files, options are read as COUNT_DTYPE
+COLUMN_DTYPES = {"n": "int32", "house": "category", "choice": "category"}
+COUNT_DTYPE = "int32"
+# tags the columnar cache, to be increased whenever its format changes
+CACHE_VERSION = 2
+
+
 class SurveyResults(Process):
     """
+    Responses to each question are loaded lazily, one column at a time, with 
+    explicit dtypes. With "columnar_cache" set, each question file is converted 
+    once to one .npy file per column under cache/, which later runs memory-map
+    instead of parsing the CSV.
     """
     def __init__(self, params):
         super().__init__(params)
-
         self.question_dfs = {}
-        for question_file in self.questions.keys():
-            path = os.path.join(self.dir, "data", question_file)
-            self.question_dfs[question_file] = pd.read_csv(path)
+
+    def get_question_df(self, question, columns):
+        """
+        Returns the given columns of the responses to question, loading each 
+        column the first time it is requested. 
+        args:
+            question    (str)   the question file
+            columns     (list)  the column names
+        """
+        df = self.question_dfs.get(question)
+        missing = [column for column in columns if df is None or column not in df]
+        if missing:
+            loaded = self.load_columns(question, missing)
+            df = loaded if df is None else pd.concat([df, loaded], axis=1)
+            self.question_dfs[question] = df
+        return df[columns]
+
+    def get_dtypes(self, question):
+        """
+        Returns the dtypes of the columns of question, which a question may 
+        override with a "dtypes" entry in its parameters. 
+        """
+        params = self.questions[question]
+        dtypes = {option: COUNT_DTYPE for option in params["options"]}
+        dtypes.update(COLUMN_DTYPES)
+        dtypes.update(params.get("dtypes", {}))
+        return dtypes
+
+    def load_columns(self, question, columns):
+        """
+        Loads the given columns of the responses to question, from the columnar 
+        cache if enabled and otherwise from the CSV.
+        """
+        path = os.path.join(self.dir, "data", question)
+        if not getattr(self, "columnar_cache", False):
+            return pd.read_csv(path, usecols=columns, dtype=self.get_dtypes(question))
+
+        # the cache is rebuilt when the CSV, the dtypes or the cache format change
+        cache_dir = os.path.join(self.dir, "cache", os.path.splitext(question)[0])
+        index_path = os.path.join(cache_dir, "columns.json")
+        key = {"cache_version": CACHE_VERSION, "dtypes": self.get_dtypes(question)}
+        index = {}
+        if (os.path.exists(index_path) and 
+            os.path.getmtime(index_path) >= os.path.getmtime(path)):
+            with open(index_path) as f:
+                index = json.load(f)
+        if index.get("key") != key:
+            index = self.build_cache(question, path, cache_dir, key)
+        categorical = index["categorical"]
+
+        data = {}
+        for column in columns:
+            values = np.load(os.path.join(cache_dir, column + ".npy"), mmap_mode="r")
+            if categorical[column]:
+                categories = np.load(os.path.join(cache_dir, column + ".categories.npy"))
+                values = pd.Categorical.from_codes(values, categories)
+            data[column] = values
+        return pd.DataFrame(data, copy=False)
+
+    def build_cache(self, question, path, cache_dir, key):
+        """
+        Converts the CSV of question to one .npy file per column. Columns that are
+        not numeric are stored as categorical codes and categories. 
+        args:
+            key     (dict)  what the cache depends on besides the CSV
+        returns:
+            index   (dict)  the key, and whether each column is categorical
+        """
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        df = pd.read_csv(path, dtype=self.get_dtypes(question))
+        df = df.loc[:, ~df.columns.str.startswith("Unnamed")]
+
+        categorical = {}
+        for column in df.columns:
+            values = df[column]
+            categorical[column] = not pd.api.types.is_numeric_dtype(values)
+            if categorical[column]:
+                values = values.astype("category")
+                np.save(os.path.join(cache_dir, column + ".categories.npy"), 
+                        np.array(values.cat.categories, dtype=str))
+                values = values.cat.codes
+            np.save(os.path.join(cache_dir, column + ".npy"), values.values)
+
+        # written last, marks the cache as complete
+        index = {"key": key, "categorical": categorical}
+        with open(os.path.join(cache_dir, "columns.json"), "w") as f:
+            json.dump(index, f)
+        return index
     
     def run(self):
+        self.compute_statistics()
         for question_file in self.questions.keys():
             self.binomial_test(question_file)
         
@@ -30,22 +127,129 @@ class SurveyResults(Process):
             for plot_method in params["plots"]:
                 getattr(self, plot_method)(question_file)
 
-    def binomial_test(self, question):
+    def get_responses(self):
         """
+        Collects the option columns of all questions into one long table with 
+        columns "question", "option" and "chosen". 
         """
-        params = self.questions[question]
-        df = self.question_dfs[question]
+        responses = []
+        for question, params in self.questions.items():
+            df = self.get_question_df(question, params["options"])
+            responses.append(pd.DataFrame({
+                "question": question,
+                "option": np.repeat(params["options"], len(df)),
+                "chosen": df.values.T.reshape(-1)
+            }))
+        return pd.concat(responses, ignore_index=True)
+
+    def compute_statistics(self):
+        """
+        Computes for every option of every question the number of responses 
+        choosing it, an exact two-sided binomial test against choosing uniformly at
+        random, and a bootstrap confidence interval of the proportion. The tidy 
+        table is saved to statistics.csv. 
+        """
+        responses = self.get_responses()
+        table = (responses.groupby(["question", "option"], sort=False)["chosen"]
+                 .sum().rename("count").reset_index())
+        by_question = table.groupby("question", sort=False)
+        table["total"] = by_question["count"].transform("sum")
+        table["chance"] = 1 / by_question["option"].transform("size")
+        table["proportion"] = table["count"] / table["total"]
+        table["target"] = [self.questions[question]["target"] == option 
+                           for question, option in zip(table["question"], table["option"])]
 
-        counts = {option: np.sum(df[option]) for option in params["options"]}
+        table["p_value"] = binomial_test(table["count"].values, table["total"].values,
+                                         table["chance"].values)
+        table["ci_low"], table["ci_high"] = bootstrap_interval(
+            table["count"].values, table["total"].values,
+            num_samples=getattr(self, "num_bootstrap", 10000),
+            random_state=self.random_state)
 
-        total = np.sum(list(counts.values()))
+        table.to_csv(os.path.join(self.dir, "statistics.csv"), index=False)
+        self.statistics = table
+        return table
+
+    def binomial_test(self, question):
+        """
+        Prints the counts of each option of question and the p-value of the target
+        option. 
+        """
+        table = self.statistics[self.statistics["question"] == question]
+
+        counts = dict(zip(table["option"], table["count"]))
 
         print(counts)
-        print(binom_test(counts[params["target"]], total, p=1 / len(params["options"])))
+        print(table.loc[table["target"], "p_value"].iloc[0])
     
     def group_plot(self, question):
-        df = self.question_dfs[question]
-        #plot = sns.countplot(x="house", hue="choice", data=df)
-        plot = sns.barplot(x="house", y="house", hue="choice", data=df, estimator=lambda x: len(x) / len(df) * 100, orient="v")
-        plt.savefig(os.path.join(self.dir, "group_plot.pdf"))
+        """
+        Saves the percentage of all responses to question choosing each option by 
+        house to results/group_plot.csv for the first question and to
+        results/group_plot_{question}.csv for the others, and plots it to a PDF 
+        of the same name, unless plots are deferred to the plot process. 
+        """
+        df = self.get_question_df(question, ["house", "choice"])
+        table = df.groupby(["house", "choice"], observed=True).size().rename("percent").reset_index()
+        table["percent"] *= 100 / len(df)
 
+        results_dir = os.path.join(self.dir, "results")
+        if not os.path.exists(results_dir):
+            os.makedirs(results_dir)
+        # the first question keeps the name of a single survey's figure
+        name = "group_plot"
+        if question != next(iter(self.questions)):
+            name += "_" + os.path.splitext(question)[0]
+        table.to_csv(os.path.join(results_dir, name + ".csv"), index=False)
+
+        if not getattr(self, "defer_plots", False):
+            plot_groups(table, os.path.join(self.dir, name + ".pdf"))
+
+
+def binomial_test(counts, totals, p):
+    """
+    Computes exact two-sided binomial test p-values for many tests at once. As in
+    scipy.stats.binom_test, the p-value sums the probabilities of all outcomes no 
+    more likely than the observed one. 
+    args:
+        counts  (ndarray)   1D array of observed successes
+        totals  (ndarray)   1D array of trials
+        p       (ndarray)   1D array of success probabilities under the null
+    returns:
+        p_values    (ndarray)   1D array of p-values
+    """
+    counts = np.asarray(counts).reshape(-1, 1)
+    totals = np.asarray(totals).reshape(-1, 1)
+    p = np.asarray(p).reshape(-1, 1)
+
+    outcomes = np.arange(np.max(totals) + 1).reshape(1, -1)
+    probabilities = np.where(outcomes <= totals, binom.pmf(outcomes, totals, p), 0)
+    observed = binom.pmf(counts, totals, p)
+    p_values = np.sum(np.where(probabilities <= observed * (1 + 1e-7), probabilities, 0), 
+                      axis=1)
+    return np.minimum(p_values, 1.0)
+
+
+def bootstrap_interval(counts, totals, num_samples=10000, level=0.95, 
+                       random_state=np.random):
+    """
+    Computes percentile bootstrap confidence intervals of many proportions at once.
+    Resampling the responses with replacement draws the count of an option from
+    a binomial distribution, so the resamples are drawn directly. 
+    args:
+        counts      (ndarray)   1D array of observed successes
+        totals      (ndarray)   1D array of trials
+        num_samples (int)   number of bootstrap resamples
+        level       (float) confidence level of the intervals
+        random_state    (RandomState) to resample with
+    returns:
+        low         (ndarray)   1D array of lower bounds
+        high        (ndarray)   1D array of upper bounds
+    """
+    counts = np.asarray(counts)
+    totals = np.asarray(totals)
+    resamples = random_state.binomial(totals, counts / totals, 
+                                      size=(num_samples, len(counts))) / totals
+    alpha = (1 - level) / 2
+    low, high = np.quantile(resamples, [alpha, 1 - alpha], axis=0)
+    return low, high
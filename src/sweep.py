@@ -0,0 +1,257 @@
+"""
+Runs the samples of a simulation over many worker processes without copying
+them. Sampled valuations and the assignments, prices and envy-freeness of every
+sample live in shared memory, sampled in place by the parent and solved and
+verified in place by the workers, which only receive index ranges.
+"""
+from multiprocessing import Pool
+
+import numpy as np
+
+from methods.priority import PriorityMethod
+from methods.solver import SolverError
+
+# shared memory blocks need Python 3.8 or later, and are only used when a
+# process sets "shared_memory"
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+
+class SharedArrays():
+    """
+    Named numpy arrays backed by shared memory blocks. Workers attach to the
+    arrays by their specs, which are small and cheap to pickle.
+    Example usage:
+        arrays = SharedArrays()
+        arrays.create("valuations", (num_samples, n, n), float)
+        with Pool(num_workers) as pool:
+            pool.starmap(work, [(arrays.get_specs(), start, stop) for ...])
+        arrays.unlink()
+    """
+
+    def __init__(self):
+        if shared_memory is None:
+            raise RuntimeError("\"shared_memory\" needs Python 3.8 or later")
+        self.blocks = {}
+        self.arrays = {}
+
+    def create(self, name, shape, dtype):
+        """
+        Allocates a new shared array.
+        args:
+            name    (str)   name of the array
+            shape   (tuple) shape of the array
+            dtype   (type)  numpy dtype of the array
+        returns:
+            array   (ndarray) the array, backed by shared memory
+        """
+        dtype = np.dtype(dtype)
+        size = max(int(np.prod(shape)) * dtype.itemsize, 1)
+        block = shared_memory.SharedMemory(create=True, size=size)
+        self.blocks[name] = block
+        self.arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        return self.arrays[name]
+
+    def get_specs(self):
+        """
+        Returns what other processes need to attach to the arrays.
+        returns:
+            specs   (dict)  name to (block name, shape, dtype string)
+        """
+        return {name: (self.blocks[name].name, array.shape, array.dtype.str)
+                for name, array in self.arrays.items()}
+
+    @classmethod
+    def attach(cls, specs):
+        """
+        Attaches to arrays created by another process.
+        args:
+            specs   (dict)  as returned by get_specs
+        """
+        arrays = cls()
+        for name, (block_name, shape, dtype) in specs.items():
+            block = shared_memory.SharedMemory(name=block_name)
+            arrays.blocks[name] = block
+            arrays.arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+        return arrays
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    def close(self):
+        """
+        Detaches from the arrays, which must not be used afterwards.
+        """
+        self.arrays = {}
+        for block in self.blocks.values():
+            block.close()
+
+    def unlink(self):
+        """
+        Detaches from and frees the arrays. Called once by the creating process.
+        """
+        blocks = self.blocks
+        self.close()
+        for block in blocks.values():
+            block.unlink()
+
+
+class SweepRunner():
+    """
+    Runs the samples of a Simulation or NoisySimulation in parallel on shared
+    memory. Valuations are sampled once per sweep and reused by every method.
+    Example usage:
+        runner = SweepRunner(simulation, num_workers=8)
+        solved, envy_free = runner.run(MaxMinUtilityMethod)
+        runner.close()
+    """
+
+    def __init__(self, simulation, num_workers=1, chunk_size=1000):
+        """
+        Samples the starting valuations and priorities of the simulation.
+        args:
+            simulation      (Process)   a Simulation or NoisySimulation, which
+                            provides n, num_samples and batch sampling
+            num_workers     (int)       number of worker processes
+            chunk_size      (int)       number of samples per task
+        """
+        self.simulation = simulation
+        self.num_workers = num_workers
+        self.chunk_size = chunk_size
+        self.n = simulation.n
+        self.num_samples = simulation.num_samples
+        # ties are broken per sample, so results do not depend on the chunks
+        self.tiebreak_seed = None
+        if getattr(simulation, "tiebreak", False):
+            self.tiebreak_seed = getattr(simulation, "seed", 0)
+
+        # valuations and prices take the simulation's "dtype", assignments the
+        # smallest integer type holding a room
+        dtype = getattr(simulation, "dtype", "float64")
+        self.arrays = SharedArrays()
+        valuations = self.arrays.create("valuations", (self.num_samples, self.n, self.n),
+                                        dtype)
+        self.arrays.create("observed", (self.num_samples, self.n, self.n), dtype)
+        priorities = self.arrays.create("priorities", (self.num_samples, self.n), dtype)
+        self.arrays.create("assignments", (self.num_samples, self.n), 
+                           np.min_scalar_type(self.n))
+        self.arrays.create("prices", (self.num_samples, self.n), dtype)
+        self.arrays.create("solved", (self.num_samples,), bool)
+        self.arrays.create("envy_free", (self.num_samples,), bool)
+
+        for start, stop in self.get_chunks():
+            valuations[start:stop] = simulation.get_starting_valuations_batch(stop - start)
+            priorities[start:stop] = simulation.random_state.uniform(0, 1, 
+                                                                     size=(stop - start, self.n))
+
+        # workers are started once and reused by every run
+        self.pool = Pool(num_workers) if num_workers > 1 else None
+
+    def get_chunks(self):
+        """
+        Splits the samples into index ranges of at most chunk_size.
+        """
+        return [(start, min(start + self.chunk_size, self.num_samples))
+                for start in range(0, self.num_samples, self.chunk_size)]
+
+    def run(self, method_class, noise_scale=None):
+        """
+        Solves every sample with method_class and checks whether the split is
+        envy-free for the starting valuations.
+        args:
+            method_class    (class) a class of Method type
+            noise_scale     (float) if set, the method sees valuations perturbed by
+                            the simulation with this scale, otherwise the starting
+                            valuations
+        returns:
+            solved          (ndarray)   1D boolean array of shape (num_samples,),
+                            whether the program had a solution
+            envy_free       (ndarray)   1D boolean array of shape (num_samples,)
+        """
+        observed = self.arrays["observed"]
+        for start, stop in self.get_chunks():
+            valuations = self.arrays["valuations"][start:stop]
+            if noise_scale is None:
+                observed[start:stop] = valuations
+            else:
+                observed[start:stop] = self.simulation.perturb_valuations_batch(valuations,
+                                                                                noise_scale)
+
+        args = [(self.arrays.get_specs(), method_class, start, stop, self.tiebreak_seed)
+                for start, stop in self.get_chunks()]
+        if self.pool is not None:
+            self.pool.starmap(solve_chunk, args)
+        else:
+            for arg in args:
+                solve_chunk(*arg)
+        return self.arrays["solved"].copy(), self.arrays["envy_free"].copy()
+
+    def close(self):
+        """
+        Stops the workers and frees the shared memory.
+        """
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+        self.arrays.unlink()
+
+
+def solve_chunk(specs, method_class, start, stop, tiebreak_seed=None):
+    """
+    Solves the samples start to stop in place, writing their assignments, prices
+    and whether they were solved and envy-free to the shared arrays.
+    args:
+        specs           (dict)  specs of the shared arrays
+        method_class    (class) a class of Method type
+        start, stop     (int)   the range of samples
+        tiebreak_seed   (int)   if set, ties between assignments of sample i are
+                        broken with the seed [tiebreak_seed, i]
+    """
+    arrays = SharedArrays.attach(specs)
+    observed = arrays["observed"]
+    assignments = arrays["assignments"]
+    prices = arrays["prices"]
+    solved = arrays["solved"]
+    for i in range(start, stop):
+        tiebreak = None if tiebreak_seed is None else [tiebreak_seed, i]
+        if issubclass(method_class, PriorityMethod):
+            method = method_class(observed[i], arrays["priorities"][i], verbosity=0,
+                                  tiebreak=tiebreak)
+        else:
+            method = method_class(observed[i], verbosity=0, tiebreak=tiebreak)
+        try:
+            assignments[i], prices[i] = method.solve()
+            solved[i] = True
+        except SolverError:
+            solved[i] = False
+
+    arrays["envy_free"][start:stop] = solved[start:stop] & get_envy_free(
+        arrays["valuations"][start:stop], assignments[start:stop], prices[start:stop])
+
+    # views into the blocks must be released before they are closed
+    del observed, assignments, prices, solved
+    arrays.close()
+
+
+def get_envy_free(valuations, assignments, prices, epsilon=1e-5):
+    """
+    Checks a batch of splits for envy-freeness, as NoisySimulation.is_envy_free.
+    Each of the two utilities compared rounds a valuation and a price, so the
+    tolerated envy is raised to four times the machine epsilon of their dtype,
+    relative to the largest valuation or price of the split, when that is more.
+    args:
+        valuations      (ndarray)   3D array of shape (b, n, m) of valuations
+        assignments     (ndarray)   2D array of shape (b, n) of assignments
+        prices          (ndarray)   2D array of shape (b, m) of prices
+        epsilon         (float)     envy tolerated
+    returns:
+        envy_free       (ndarray)   1D boolean array of shape (b,)
+    """
+    dtype = np.result_type(valuations, prices, np.float16)
+    scale = np.maximum(np.max(np.abs(valuations), axis=(1, 2)), np.max(np.abs(prices), axis=1))
+    tolerance = np.maximum(epsilon, 4 * np.finfo(dtype).eps * scale)
+    utilities = valuations - prices[:, np.newaxis, :]
+    assigned = np.take_along_axis(utilities, assignments[:, :, np.newaxis], axis=2)
+    return np.all(assigned + tolerance[:, np.newaxis, np.newaxis] >= utilities, axis=(1, 2))
@@ -1,23 +1,45 @@
+import atexit
 import json
 import os
 import logging
+import logging.handlers
+import queue
+import threading
+import time
 
 
 import numpy as np
 
 class Process():
     """
+    All randomness of a process is drawn from self.random_state, seeded by 
+    "seed" if given, so that runs with the same parameters give the same results.
     """
     def __init__(self, dir):
         self.dir = dir
         self.update(os.path.join(dir, "params.json"))
-        set_logger(os.path.join(dir, "process.log"))
+        self.random_state = np.random.RandomState(getattr(self, "seed", None))
+        if getattr(self, "async_logging", False):
+            set_queue_logger(os.path.join(dir, "process.jsonl"),
+                             rate=getattr(self, "log_rate", None),
+                             sample_every=getattr(self, "log_sample_every", 1))
+        else:
+            set_logger(os.path.join(dir, "process.log"))
         
 
     def run(self, overwrite=False):
         """
         """
         return True 
+
+    def get_tiebreak(self):
+        """
+        Returns the random state that methods break ties between welfare-maximizing
+        assignments with, or None unless "tiebreak" is set. 
+        """
+        if getattr(self, "tiebreak", False):
+            return self.random_state
+        return None
     
 
     def update(self, json_path):
@@ -27,6 +49,32 @@ class Process():
             self.__dict__.update(params)
 
 
+def sample_dirichlet(alphas, dtype=np.float64, random_state=np.random, chunk_size=2 ** 20):
+    """
+    Samples a dirichlet distribution for each vector of concentration parameters
+    along the last axis of alphas. The gamma variables are drawn in 64-bit, so 
+    for other dtypes they are drawn about chunk_size at a time, along the first
+    axis, and written into the samples, which keeps the 64-bit copies small. 
+    The chunks are drawn in order, so the samples do not depend on chunk_size.
+    args:
+        alphas  (ndarray)   concentration parameters of shape (..., n), which 
+                may be a broadcast view
+        dtype   (type)      float dtype of the samples, e.g. np.float32 to halve 
+                their memory
+        random_state    (RandomState) to sample with, the global one by default
+        chunk_size      (int)   the number of gamma variables drawn at once
+    """
+    if np.dtype(dtype) == np.float64:
+        samples = random_state.gamma(alphas)
+    else:
+        samples = np.empty(alphas.shape, dtype=dtype)
+        step = max(chunk_size * len(alphas) // max(alphas.size, 1), 1)
+        for start in range(0, len(alphas), step):
+            samples[start:start + step] = random_state.gamma(alphas[start:start + step])
+    samples /= np.sum(samples, axis=-1, keepdims=True)
+    return samples
+
+
 def set_logger(log_path, level=logging.INFO, console=True):
     """Sets the logger to log info in terminal and file `log_path`.
 
@@ -54,4 +102,126 @@ def set_logger(log_path, level=logging.INFO, console=True):
         if console:
             stream_handler = logging.StreamHandler()
             stream_handler.setFormatter(logging.Formatter('%(message)s'))
-            logger.addHandler(stream_handler)
\ No newline at end of file
+            logger.addHandler(stream_handler)
+
+
+def set_queue_logger(log_path, level=logging.INFO, console=True, rate=None, 
+                     sample_every=1):
+    """Sets the logger to log info in terminal and file `log_path` without blocking
+    the caller.
+
+    Records are put on a queue unformatted and a listener thread formats and writes 
+    them, so a solve loop only pays for the enqueue. The file holds one JSON object 
+    per line. Records can be sampled or rate-limited before they are enqueued. 
+    Structured fields are passed with `extra`.
+
+    Example:
+    ```
+    logging.info("No solution.", extra={"data": {"sample": i}})
+    ```
+
+    Args:
+        log_path: (string) where to log
+        rate: (float) maximum records per second per message, None for no limit
+        sample_every: (int) keep only every sample_every-th record of each message
+    """
+    logger = logging.getLogger()
+    logger.setLevel(level)
+
+    if not logger.handlers:
+        # Logging to a file
+        file_handler = logging.FileHandler(log_path)
+        file_handler.setFormatter(JsonlFormatter())
+        handlers = [file_handler]
+
+        # Logging to console
+        if console:
+            stream_handler = logging.StreamHandler()
+            stream_handler.setFormatter(logging.Formatter('%(message)s'))
+            handlers.append(stream_handler)
+
+        record_queue = queue.SimpleQueue()
+        queue_handler = DeferredQueueHandler(record_queue)
+        queue_handler.addFilter(SampleFilter(rate=rate, sample_every=sample_every))
+        logger.addHandler(queue_handler)
+
+        listener = logging.handlers.QueueListener(record_queue, *handlers, 
+                                                  respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that leaves formatting to the listener thread. Arguments of a 
+    record must not be mutated after it is logged.
+    """
+
+    def prepare(self, record):
+        """
+        Returns the record as is, instead of formatting it in the logging thread.
+        """
+        return record
+
+
+class SampleFilter(logging.Filter):
+    """
+    Drops records so that at most one in sample_every records and at most rate
+    records per second are kept for each call site. Records are keyed by where
+    they are logged rather than by their message, since messages formatted with
+    f-strings differ on every call. 
+    """
+
+    def __init__(self, rate=None, sample_every=1):
+        super().__init__()
+        self.rate = rate
+        self.sample_every = sample_every
+        self.counts = {}
+        self.windows = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        key = (record.name, record.levelno, record.pathname, record.lineno)
+        with self.lock:
+            count = self.counts.get(key, 0)
+            self.counts[key] = count + 1
+            if count % self.sample_every != 0:
+                return False
+            if self.rate is None:
+                return True
+
+            # count records kept in the current one second window
+            now = time.monotonic()
+            start, kept = self.windows.get(key, (now, 0))
+            if now - start >= 1.0:
+                start, kept = now, 0
+            if kept >= self.rate:
+                return False
+            self.windows[key] = (start, kept + 1)
+            return True
+
+
+class JsonlFormatter(logging.Formatter):
+    """
+    Formats records as JSON objects with the time, level and message, plus the 
+    fields passed in `extra={"data": {...}}`.
+    """
+
+    def format(self, record):
+        entry = {"time": record.created,
+                 "level": record.levelname,
+                 "message": record.getMessage()}
+        if hasattr(record, "data"):
+            entry.update(record.data)
+        return json.dumps(entry, default=to_json)
+
+
+def to_json(value):
+    """
+    Converts numpy values that json cannot serialize.
+    """
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value)} is not JSON serializable")
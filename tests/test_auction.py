@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from methods.auction import auction
+from methods.hungarian import hungarian
+from methods.solver import SolverError
+
+
+def test_spare_rooms_with_near_ties():
+    # 40 agents and 41 rooms, where the first 20 rooms are worth about the same
+    valuations = np.random.RandomState(0).rand(40, 41) * 1e-6
+    valuations[:, :20] += 1
+    assignments, prices = auction(valuations)
+
+    rows = np.arange(40)
+    assert len(np.unique(assignments)) == 40
+    assert np.isclose(np.sum(valuations[rows, assignments]),
+                      np.sum(valuations[rows, hungarian(valuations)]), rtol=0, atol=1e-7)
+    profits = valuations - prices
+    assert np.all(np.max(profits, axis=1) - profits[rows, assignments] <= 1e-7)
+
+
+def test_unfinished_phase_raises():
+    valuations = np.random.RandomState(0).rand(40, 41) * 1e-6
+    valuations[:, :20] += 1
+    with pytest.raises(SolverError):
+        auction(valuations, max_rounds=5)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_spare_rooms_match_hungarian(seed):
+    random_state = np.random.RandomState(seed)
+    n, m = 30, 45
+    valuations = random_state.rand(n, m)
+    capacities = random_state.randint(1, 3, size=m)
+    assignments, prices = auction(valuations, capacities)
+
+    rows = np.arange(n)
+    assert np.all(np.bincount(assignments, minlength=m) <= capacities)
+    assert np.isclose(np.sum(valuations[rows, assignments]),
+                      np.sum(valuations[rows, hungarian(valuations, capacities)]),
+                      rtol=0, atol=1e-7)
+    # empty rooms cost no more than any occupied one
+    occupied = np.bincount(assignments, minlength=m) > 0
+    assert np.all(prices[~occupied] <= np.min(prices[occupied]) + 1e-12)
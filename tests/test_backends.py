@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from methods.backends import BACKENDS, is_available
+from methods.price import MinMaxPriceMethod
+from methods.utility import MaxMinUtilityMethod
+
+
+@pytest.mark.parametrize("backend", sorted(BACKENDS))
+@pytest.mark.parametrize("method_class", [MaxMinUtilityMethod, MinMaxPriceMethod])
+@pytest.mark.parametrize("n, m", [(3, 3), (5, 5), (4, 6)])
+def test_backends_match_glpk(backend, method_class, n, m):
+    if not is_available(backend):
+        pytest.skip(f"{backend} is not available")
+    random_state = np.random.RandomState(n * m)
+    for _ in range(5):
+        valuations = random_state.dirichlet(np.ones(m), size=n)
+        assignments, prices = method_class(valuations, verbosity=0, 
+                                           backend=backend).solve()
+        reference_assignments, reference_prices = method_class(valuations, verbosity=0,
+                                                               backend="glpk").solve()
+        np.testing.assert_array_equal(assignments, reference_assignments)
+
+        # the objectives leave prices of empty rooms free above the point where 
+        # they are envied, so only occupied rooms must match
+        occupied = np.bincount(assignments, minlength=m) > 0
+        np.testing.assert_allclose(prices[occupied], reference_prices[occupied], atol=1e-6)
+        utilities = valuations - prices
+        assert np.all(np.max(utilities, axis=1) <= 
+                      utilities[np.arange(n), assignments] + 1e-6)
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+from scipy.optimize import linprog
+
+from methods.backends import BACKENDS, is_available
+from methods.envy_index import EnvyIndex
+import split
+
+
+def get_price_range(valuations, assignments, room):
+    """Minimizes and maximizes the price of room over the envy-free prices."""
+    n, m = valuations.shape
+    # p[a_i] - p[j] <= v[i, a_i] - v[i, j]
+    A_ub = np.zeros((n * m, m))
+    b_ub = np.zeros(n * m)
+    for i in range(n):
+        for j in range(m):
+            A_ub[i * m + j, assignments[i]] += 1
+            A_ub[i * m + j, j] -= 1
+            b_ub[i * m + j] = valuations[i, assignments[i]] - valuations[i, j]
+    A_eq = np.bincount(assignments, minlength=m).reshape(1, -1).astype(float)
+    c = np.zeros(m)
+    c[room] = 1
+    bounds = [(None, None)] * m
+    low = linprog(c, A_ub, b_ub, A_eq, [1], bounds=bounds)
+    high = linprog(-c, A_ub, b_ub, A_eq, [1], bounds=bounds)
+    return low.fun, (-high.fun if high.status == 0 else np.inf)
+
+
+@pytest.mark.parametrize("backend", sorted(BACKENDS))
+@pytest.mark.parametrize("seed", range(3))
+def test_price_intervals_match_lp(backend, seed):
+    if not is_available(backend):
+        pytest.skip(f"{backend} is not available")
+    random_state = np.random.RandomState(seed)
+    valuations = random_state.dirichlet(np.ones(5), size=4)
+    index = EnvyIndex(valuations, backend=backend)
+
+    for room in range(5):
+        low, high = get_price_range(valuations, index.assignments, room)
+        interval = index.get_price_interval(room)
+        assert np.isclose(interval[0], low, atol=1e-7)
+        if np.isinf(high):
+            assert np.isinf(interval[1])
+        else:
+            assert np.isclose(interval[1], high, atol=1e-7)
+
+
+def test_split_passes_backend(monkeypatch):
+    backends = []
+
+    def make_index(*args, backend="glpk", **kwargs):
+        backends.append(backend)
+        return EnvyIndex(*args, backend=backend, **kwargs)
+
+    monkeypatch.setattr(split, "EnvyIndex", make_index)
+    params = {"n": 3, "total_rent": 1000, "backend": "numpy",
+              "agent_to_valuations": {"Sabri": [200, 300, 500],
+                                      "Kye": [150, 250, 600],
+                                      "KiJung": [300, 300, 400]}}
+    index = split.Split(params).get_index()
+    assert backends == ["numpy"]
+    low, high = index.get_price_interval(0)
+    assert low <= high
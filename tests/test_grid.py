@@ -0,0 +1,51 @@
+import json
+
+import grid
+from methods.solver import SolverError
+from methods.utility import MaxMinUtilityMethod
+
+
+def make_cell(**params):
+    cell = {"method": "MaxMinUtilityMethod", "options": {}, "noise_scale": 100.0,
+            "tiebreak": False, "dtype": "float64", "n": 3, "num_samples": 6,
+            "mean_scale": 20, "initial_scale": 10, "seed": 0}
+    cell.update(params)
+    return cell
+
+
+class FailingMethod(MaxMinUtilityMethod):
+    """Fails every other sample."""
+    calls = 0
+
+    def solve(self):
+        FailingMethod.calls += 1
+        if FailingMethod.calls % 2 == 0:
+            raise SolverError("no solution")
+        return super().solve()
+
+
+def test_run_cell_counts_failures(tmp_path, monkeypatch):
+    monkeypatch.setitem(grid.__dict__, "FailingMethod", FailingMethod)
+    FailingMethod.calls = 0
+    cell = make_cell(method="FailingMethod")
+    fraction = grid.run_cell(cell, str(tmp_path))
+
+    with open(grid.get_cell_path(str(tmp_path), cell)) as f:
+        result = json.load(f)
+    assert result["num_failed"] == 3
+    assert result["fraction"] == fraction
+    assert fraction <= 0.5
+
+
+def test_run_cell_tiebreak_and_dtype(tmp_path):
+    for tiebreak in [False, True]:
+        for dtype in ["float64", "float32"]:
+            cell = make_cell(tiebreak=tiebreak, dtype=dtype)
+            fraction = grid.run_cell(cell, str(tmp_path))
+            assert 0 <= fraction <= 1
+
+
+def test_cell_hash_includes_tiebreak_and_dtype():
+    hashes = {grid.get_cell_hash(make_cell(tiebreak=tiebreak, dtype=dtype))
+              for tiebreak in [False, True] for dtype in ["float64", "float32"]}
+    assert len(hashes) == 4
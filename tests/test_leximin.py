@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+from scipy.optimize import linprog
+
+from methods.utility import MaxMinUtilityMethod
+
+
+def solve_naive_leximin(valuations, assignments, tolerance=1e-7):
+    """
+    Raises the minimum utility of the agents not yet fixed, then fixes, one at a
+    time, each agent who cannot rise above it while the others stay at it.
+    """
+    n, m = valuations.shape
+    rows = np.arange(n)
+    own = valuations[rows, assignments]
+    # variables are the prices and the level, u[i] = own[i] - p[a_i]
+    A_ub = []
+    b_ub = []
+    for i in range(n):
+        for j in range(m):
+            row = np.zeros(m + 1)
+            row[assignments[i]] += 1
+            row[j] -= 1
+            A_ub.append(row)
+            b_ub.append(own[i] - valuations[i, j])
+    A_eq = [np.append(np.bincount(assignments, minlength=m), 0)]
+    b_eq = [1]
+    bounds = [(None, None)] * (m + 1)
+
+    fixed = np.full(n, np.nan)
+    while np.any(np.isnan(fixed)):
+        free = np.flatnonzero(np.isnan(fixed))
+        # level - u[i] <= 0, i.e. level + p[a_i] <= own[i]
+        G = [np.eye(m + 1)[assignments[i]] + np.eye(m + 1)[m] for i in free]
+        h = [own[i] for i in free]
+        for i in np.flatnonzero(~np.isnan(fixed)):
+            A_eq.append(np.eye(m + 1)[assignments[i]])
+            b_eq.append(own[i] - fixed[i])
+        c = np.zeros(m + 1)
+        c[m] = -1
+        level = linprog(c, np.array(A_ub + G), b_ub + h, np.array(A_eq), b_eq,
+                        bounds=bounds).x[m]
+
+        for k in free:
+            # others stay at the level, agent k maximizes its utility
+            G = [np.eye(m + 1)[assignments[i]] for i in free]
+            h = [own[i] - level for i in free]
+            c = np.eye(m + 1)[assignments[k]]
+            result = linprog(c, np.array(A_ub + G), b_ub + h, np.array(A_eq), b_eq,
+                             bounds=bounds)
+            if own[k] - result.fun <= level + tolerance:
+                fixed[k] = level
+                break
+        A_eq = A_eq[:1]
+        b_eq = b_eq[:1]
+    return fixed
+
+
+@pytest.mark.parametrize("seed", range(6))
+@pytest.mark.parametrize("spare_rooms", [0, 1])
+def test_leximin_matches_naive(seed, spare_rooms):
+    random_state = np.random.RandomState(seed)
+    n = random_state.randint(3, 6)
+    # small integers make ties between utility levels common
+    valuations = random_state.randint(1, 5, size=(n, n + spare_rooms)).astype(float)
+    valuations /= np.sum(valuations, axis=1, keepdims=True)
+
+    method = MaxMinUtilityMethod(valuations, verbosity=0, leximin=True)
+    assignments, prices = method.solve()
+    utilities = valuations[np.arange(n), assignments] - prices[assignments]
+    np.testing.assert_allclose(utilities, solve_naive_leximin(valuations, assignments),
+                               atol=1e-6)
@@ -0,0 +1,45 @@
+import logging
+
+from utils import SampleFilter
+
+
+class ListHandler(logging.Handler):
+
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def make_logger(log_filter):
+    logger = logging.getLogger(f"test_logging_{id(log_filter)}")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    handler = ListHandler()
+    handler.addFilter(log_filter)
+    logger.addHandler(handler)
+    return logger, handler
+
+
+def test_records_of_one_call_site_are_sampled():
+    logger, handler = make_logger(SampleFilter(sample_every=10))
+    for i in range(100):
+        logger.info(f"sample {i} of 100")
+    assert handler.messages == [f"sample {i} of 100" for i in range(0, 100, 10)]
+
+
+def test_call_sites_are_sampled_separately():
+    logger, handler = make_logger(SampleFilter(sample_every=10))
+    for i in range(10):
+        logger.info(f"first {i}")
+        logger.info(f"second {i}")
+    assert handler.messages == ["first 0", "second 0"]
+
+
+def test_records_are_rate_limited():
+    logger, handler = make_logger(SampleFilter(rate=5))
+    for i in range(100):
+        logger.info(f"sample {i}")
+    assert len(handler.messages) == 5
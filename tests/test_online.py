@@ -0,0 +1,140 @@
+import numpy as np
+import pytest
+
+from methods.hungarian import hungarian
+from methods.online import OnlineSession
+from methods.utility import MaxMinUtilityMethod
+
+
+TOTAL_RENT = 1000.0
+
+
+class Building():
+    """Mirrors the events of a session to solve the building from scratch."""
+
+    def __init__(self):
+        self.session = OnlineSession(total_rent=TOTAL_RENT)
+        self.capacities = {}
+        self.valuations = {}
+
+    def get_arrays(self):
+        agents = list(self.valuations)
+        rooms = list(self.capacities)
+        valuations = np.array([[self.valuations[agent][room] for room in rooms]
+                               for agent in agents]).reshape(len(agents), len(rooms))
+        return agents, rooms, valuations, np.array([self.capacities[room] for room in rooms])
+
+    def check(self):
+        agents, rooms, valuations, capacities = self.get_arrays()
+        assignments = self.session.get_assignments()
+        prices = self.session.get_prices()
+        if not agents:
+            return
+
+        # the same welfare as a fresh assignment
+        rows = np.arange(len(agents))
+        fresh = hungarian(valuations, capacities)
+        assert np.isclose(self.session.get_welfare(), np.sum(valuations[rows, fresh]))
+
+        columns = np.array([rooms.index(assignments[agent]) for agent in agents])
+        assert np.all(np.bincount(columns, minlength=len(rooms)) <= capacities)
+
+        # envy-free prices that sum to the rent
+        room_prices = np.array([prices[room] for room in rooms])
+        utilities = valuations - room_prices
+        assert np.all(np.max(utilities, axis=1) <= utilities[rows, columns] + 1e-6)
+        assert np.isclose(np.sum(room_prices[columns]), TOTAL_RENT)
+
+        # random valuations have a unique optimum, so a method solving from 
+        # scratch finds the same assignment and prices
+        if np.all(capacities == 1) and len(agents) == len(rooms):
+            method = MaxMinUtilityMethod(valuations / TOTAL_RENT, verbosity=0)
+            method_assignments, method_prices = method.solve()
+            np.testing.assert_array_equal(columns, method_assignments)
+            method_prices = self.session.get_method_prices()
+            np.testing.assert_allclose([method_prices[room] for room in rooms],
+                                       method.prices * TOTAL_RENT, atol=1e-6)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_random_events(seed):
+    random_state = np.random.RandomState(seed)
+    building = Building()
+    session = building.session
+    num_rooms = num_agents = 0
+    for _ in range(150):
+        event = random_state.rand()
+        capacity = sum(building.capacities.values())
+        if event < 0.2 or capacity <= len(building.valuations):
+            room = f"room{num_rooms}"
+            num_rooms += 1
+            valuations = {agent: random_state.rand() * TOTAL_RENT 
+                          for agent in building.valuations}
+            building.capacities[room] = random_state.randint(1, 3)
+            for agent, valuation in valuations.items():
+                building.valuations[agent][room] = valuation
+            session.add_room(room, valuations, building.capacities[room])
+        elif event < 0.5:
+            agent = f"agent{num_agents}"
+            num_agents += 1
+            building.valuations[agent] = {room: random_state.rand() * TOTAL_RENT
+                                          for room in building.capacities}
+            session.add_agent(agent, dict(building.valuations[agent]))
+        elif event < 0.65 and building.valuations:
+            agent = random_state.choice(list(building.valuations))
+            del building.valuations[agent]
+            session.remove_agent(agent)
+        elif event < 0.8 and building.valuations:
+            agent = random_state.choice(list(building.valuations))
+            building.valuations[agent] = {room: random_state.rand() * TOTAL_RENT
+                                          for room in building.capacities}
+            session.update_valuations(agent, dict(building.valuations[agent]))
+        else:
+            room = random_state.choice(list(building.capacities))
+            if capacity - building.capacities[room] < len(building.valuations):
+                continue
+            del building.capacities[room]
+            for valuations in building.valuations.values():
+                del valuations[room]
+            session.remove_room(room)
+        building.check()
+
+
+def test_matches_fresh_solve():
+    # a square building of single rooms is compared against a method after every event
+    random_state = np.random.RandomState(0)
+    building = Building()
+    session = building.session
+    for i in range(6):
+        room = f"room{i}"
+        building.capacities[room] = 1
+        for valuations in building.valuations.values():
+            valuations[room] = random_state.rand() * TOTAL_RENT
+        session.add_room(room, {agent: valuations[room] 
+                                for agent, valuations in building.valuations.items()})
+        building.check()
+
+        agent = f"agent{i}"
+        building.valuations[agent] = {room: random_state.rand() * TOTAL_RENT
+                                      for room in building.capacities}
+        session.add_agent(agent, dict(building.valuations[agent]))
+        building.check()
+
+    for i in range(6):
+        agent = f"agent{i}"
+        building.valuations[agent] = {room: random_state.rand() * TOTAL_RENT
+                                      for room in building.capacities}
+        session.update_valuations(agent, dict(building.valuations[agent]))
+        building.check()
+
+    for i in range(5):
+        del building.valuations[f"agent{i}"]
+        session.remove_agent(f"agent{i}")
+        building.check()
+
+        room = f"room{5 - i}"
+        del building.capacities[room]
+        for valuations in building.valuations.values():
+            del valuations[room]
+        session.remove_room(room)
+        building.check()
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from methods.demand import MinMaxDemandMethod
+from methods.priority import PriorityMethod
+from methods.utility import MaxMinUtilityMethod
+from sensitivity import CanonicalContext, SensitivitySweep
+
+
+@pytest.mark.parametrize("method_class", [MaxMinUtilityMethod, MinMaxDemandMethod,
+                                          PriorityMethod])
+@pytest.mark.parametrize("seed", range(3))
+def test_sweep_matches_resolving(method_class, seed):
+    random_state = np.random.RandomState(seed)
+    valuations = random_state.dirichlet(np.ones(4), size=4)
+    method_kwargs = {}
+    if method_class is PriorityMethod:
+        method_kwargs["priorities"] = random_state.uniform(0, 1, size=4)
+    sweep = SensitivitySweep(valuations, agent=1, room=2, method_class=method_class,
+                             method_kwargs=method_kwargs)
+    deltas = np.linspace(-0.3, 0.3, 61)
+    assignments, prices = sweep.sweep(deltas)
+    assert sweep.num_solves < len(deltas)
+
+    rows = np.arange(4)
+    for delta, curr_assignments, curr_prices in zip(deltas, assignments, prices):
+        # solved from scratch, with ties between optimal prices broken as in the sweep
+        method = sweep.get_method(delta)
+        method.context = CanonicalContext(method.context, sweep.weights)
+        solved_assignments, solved_prices = method.solve()
+
+        welfare_valuations = method.get_welfare_valuations()
+        assert np.isclose(np.sum(welfare_valuations[rows, curr_assignments]),
+                          np.sum(welfare_valuations[rows, solved_assignments]), atol=1e-9)
+        if np.array_equal(curr_assignments, solved_assignments):
+            np.testing.assert_allclose(curr_prices, solved_prices, atol=1e-6)
@@ -0,0 +1,30 @@
+import json
+
+import numpy as np
+
+from methods.priority import PriorityMethod
+from methods.utility import MaxMinUtilityMethod
+from simulate import Simulation
+
+
+def make_simulation(tmp_path, **params):
+    params = {"n": 3, "num_samples": 5, "mean_scale": 20, "initial_scale": 10,
+              "seed": 0, **params}
+    with open(tmp_path / "params.json", "w") as f:
+        json.dump(params, f)
+    return Simulation(str(tmp_path))
+
+
+def test_find_infeasible_without_priorities(tmp_path):
+    simulation = make_simulation(tmp_path)
+    valuations, priorities = simulation.find_infeasible(MaxMinUtilityMethod)
+    # envy-free prices always exist for the welfare-maximizing assignment
+    assert valuations.shape == (0, 3, 3)
+    assert priorities.shape == (0, 3)
+
+
+def test_find_infeasible_with_priorities(tmp_path):
+    simulation = make_simulation(tmp_path)
+    valuations, priorities = simulation.find_infeasible(PriorityMethod)
+    assert valuations.shape[1:] == (3, 3)
+    assert len(valuations) == len(priorities) <= 5
@@ -0,0 +1,31 @@
+import numpy as np
+
+from methods.priority import PriorityMethod
+from split import Split
+
+
+PARAMS = {"n": 3,
+          "total_rent": 1000,
+          "agent_to_valuations": {"Sabri": [200, 300, 500],
+                                  "Kye": [150, 250, 600],
+                                  "KiJung": [300, 300, 400]}}
+
+
+def test_priority_method_uses_agent_priorities():
+    params = dict(PARAMS, agent_to_priority={"Sabri": 0.9, "Kye": 0.1, "KiJung": 0.5})
+    split = Split(params)
+    np.testing.assert_allclose(split.priorities, [0.9, 0.1, 0.5])
+
+    split.solve(method_class=PriorityMethod, verbosity=0)
+    method = PriorityMethod(split.valuations, split.priorities, verbosity=0,
+                            capacities=split.capacities)
+    assignments, prices = method.solve()
+    np.testing.assert_array_equal(split.assignments, assignments)
+    np.testing.assert_allclose(split.prices, prices)
+
+
+def test_default_priorities():
+    split = Split(dict(PARAMS))
+    np.testing.assert_allclose(split.priorities, [0.5, 0.5, 0.5])
+    split.solve(method_class=PriorityMethod, verbosity=0)
+    assert np.isclose(np.sum(split.prices), 1)
@@ -0,0 +1,39 @@
+import numpy as np
+
+from methods.lp_method import LPMethod
+from methods.utility import MaxMinUtilityMethod
+
+
+def count_matchings(method):
+    calls = []
+    solve_matching = method.solve_matching
+
+    def counted(*args, **kwargs):
+        calls.append(args)
+        return solve_matching(*args, **kwargs)
+    method.solve_matching = counted
+    method.solve_assignments()
+    return len(calls)
+
+
+def test_unique_optimum_skips_second_program():
+    random_state = np.random.RandomState(0)
+    for seed in range(50):
+        n = random_state.randint(3, 8)
+        valuations = random_state.uniform(size=(n, n + seed % 3))
+        method = MaxMinUtilityMethod(valuations, verbosity=0, tiebreak=seed, backend="numpy")
+        assert count_matchings(method) == 1
+
+
+def test_tied_optimum_is_broken_by_seed():
+    # every assignment of the identical agents has the same welfare
+    valuations = np.tile([0.5, 0.3, 0.2], (3, 1))
+    assignments = set()
+    for seed in range(10):
+        method = LPMethod(valuations, verbosity=0, tiebreak=seed, backend="numpy")
+        assert count_matchings(method) == 2
+        again = LPMethod(valuations, verbosity=0, tiebreak=seed, backend="numpy")
+        again.solve_assignments()
+        assert np.array_equal(method.assignments, again.assignments)
+        assignments.add(tuple(method.assignments))
+    assert len(assignments) > 1
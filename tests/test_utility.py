@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from methods.utility import MaxMinUtilityMethod
+
+
+@pytest.mark.parametrize("seed", range(8))
+@pytest.mark.parametrize("top_k", [1, 2, 3])
+@pytest.mark.parametrize("leximin", [False, True])
+def test_top_k_matches_full_program(seed, top_k, leximin):
+    random_state = np.random.RandomState(seed)
+    n = random_state.randint(3, 9)
+    m = n + random_state.randint(0, 3)
+    valuations = random_state.dirichlet(np.ones(m), size=n)
+    capacities = np.ones(m, dtype=int)
+    capacities[0] = 2
+
+    full = MaxMinUtilityMethod(valuations, verbosity=0, capacities=capacities, 
+                               leximin=leximin)
+    assignments, prices = full.solve()
+    generated = MaxMinUtilityMethod(valuations, verbosity=0, capacities=capacities, 
+                                    top_k=top_k, leximin=leximin)
+    top_k_assignments, top_k_prices = generated.solve()
+
+    rows = np.arange(n)
+    np.testing.assert_array_equal(top_k_assignments, assignments)
+    assert np.isclose(np.sum(valuations[rows, top_k_assignments]),
+                      np.sum(valuations[rows, assignments]))
+    occupied = np.bincount(assignments, minlength=m) > 0
+    np.testing.assert_allclose(top_k_prices[occupied], prices[occupied], atol=1e-7)
+
+    # the generated constraints must still leave no envy over all rooms
+    utilities = valuations - top_k_prices
+    assert np.all(np.max(utilities, axis=1) <= utilities[rows, top_k_assignments] + 1e-7)